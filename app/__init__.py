@@ -1,10 +1,40 @@
+from collections import Counter
+from typing import List
+
 from config import Config
 
+from .async_executor import AsyncTestExecutor
 from .executor import TestExecutor
-from .publishers import GoogleSheetsPublisher
+from .publishers import publisher_classes
+
+executors = {
+    "sync": TestExecutor,
+    "async": AsyncTestExecutor,
+}
 
 
-def create_app(config: Config):
-    publisher = GoogleSheetsPublisher.from_config(config)
-    app = TestExecutor(config, publisher)
+def create_app(config: Config, engines: dict = None, clients: dict = None):
+    publisher = publisher_classes[config.PUBLISHER].from_config(config)
+    if clients is not None:
+        publisher.share_client(clients)
+    app = executors[config.EXECUTOR](config, publisher, engines)
     return app
+
+
+def create_apps(configs: List[Config]) -> list:
+    """
+    Creates an executor per test plan, sharing a database engine between plans
+    with the same database and a sheets client between plans with the same
+    credentials.
+    """
+    engines, clients = {}, {}
+    apps = [create_app(config, engines, clients) for config in configs]
+    # plans run concurrently, so a shared pool needs a connection for every
+    # worker of every plan using it
+    workers = Counter()
+    for app in apps:
+        workers[app.db_url] += app.config.WORKERS
+    for app in apps:
+        app.pool_workers = workers[app.db_url]
+        app.db
+    return apps
@@ -0,0 +1,39 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from .executor import TestExecutor
+
+
+class AsyncTestExecutor(TestExecutor):
+    """
+    Executes test cases on an asyncio event loop.
+
+    Database calls are offloaded to a thread pool, since neither pyodbc nor
+    cx_Oracle offer an asyncio interface, and results are always streamed to
+    the publisher while later batches are still executing.
+    """
+
+    def run_tests(self):
+        asyncio.run(self._run_tests())
+
+    async def _run_tests(self):
+        loop = asyncio.get_running_loop()
+        workers = max(self.config.WORKERS, 1)
+        semaphore = asyncio.Semaphore(workers)
+        batches = self.plan_batches()
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+
+            async def execute(batch):
+                async with semaphore:
+                    return await loop.run_in_executor(pool, self.run_batch, batch)
+
+            for completed in asyncio.as_completed(
+                [execute(batch) for batch in batches]
+            ):
+                for test_case in await completed:
+                    self.add_result(test_case)
+
+    def run_and_publish(self):
+        with self.streaming():
+            self.run_tests()
@@ -0,0 +1,180 @@
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.exc import DatabaseError, ProgrammingError
+
+from .cases import BaseTestCase
+from .timeouts import is_timeout
+from .timing import QueryTimer
+
+
+def group_by_applicant(
+    test_cases: List[BaseTestCase], max_size: int = 100
+) -> List[List[BaseTestCase]]:
+    """
+    Groups test cases that can be answered by a single query.
+
+    Cases are grouped on their `batch_key` (destination class, external id and
+    filters), preserving the order in which each group was first seen. Groups
+    larger than `max_size` are split into several batches.
+    """
+    groups = OrderedDict()
+    for test_case in test_cases:
+        groups.setdefault(test_case.batch_key, []).append(test_case)
+    batches = []
+    for group in groups.values():
+        for i in range(0, len(group), max_size):
+            batches.append(group[i : i + max_size])
+    return batches
+
+
+def prefixed_column(test_case: BaseTestCase, position: int) -> Tuple[str, dict]:
+    """
+    Returns the select column and bind parameters for a case occupying
+    `position` in a combined query, with its bind names prefixed so they do not
+    collide with other cases.
+    """
+    test_case.bind_prefix = f"c{position}_"
+    try:
+        column = test_case.select_column(f"actual_{position}")
+        return column, test_case.export_params
+    finally:
+        test_case.bind_prefix = ""
+
+
+def batch_sql(test_cases: List[BaseTestCase]) -> Tuple[str, dict]:
+    """
+    Builds a single select returning one aliased column per test case, along
+    with its bind parameters.
+    """
+    columns = []
+    params = {}
+    for i, test_case in enumerate(test_cases):
+        column, export_params = prefixed_column(test_case, i)
+        columns.append(column)
+        params.update(export_params)
+    params[test_cases[0].key_param] = test_cases[0].external_id
+    return test_cases[0].build_sql(",\n  ".join(columns)), params
+
+
+def execute_batch(db, test_cases: List[BaseTestCase]) -> None:
+    """
+    Executes a batch of test cases as one query and fans the result row back
+    out to each case.
+
+    If the batched query fails, the batch is split in half and each half
+    retried, so the error is recorded against the case that caused it while
+    the rest keep sharing queries.
+    """
+    if len(test_cases) == 1:
+        test_cases[0].execute(db)
+        return
+    timer = QueryTimer()
+    sql, params = batch_sql(test_cases)
+    timer.lap("build")
+    try:
+        result = db.execute(text(sql), params)
+        timer.lap("execute")
+        row = result.first()
+    except (DatabaseError, ProgrammingError) as e:
+        if is_timeout(e):
+            # retrying each case would wait out the timeout once per case
+            for test_case in test_cases:
+                test_case.store_error(e)
+            return
+        middle = len(test_cases) // 2
+        execute_batch(db, test_cases[:middle])
+        execute_batch(db, test_cases[middle:])
+    else:
+        timer.lap("fetch")
+        for i, test_case in enumerate(test_cases):
+            test_case.store_row_value(row, i)
+            test_case.record_timings(timer, len(test_cases))
+
+
+def group_by_destination(
+    test_cases: List[BaseTestCase], max_keys: int = 500
+) -> List[List[BaseTestCase]]:
+    """
+    Groups test cases by destination class and filters across applicants.
+
+    Each group holds the cases of at most `max_keys` applicants; all cases for
+    an applicant always land in the same group.
+    """
+    groups = OrderedDict()
+    for test_case in test_cases:
+        key = (test_case.__class__, test_case.filters)
+        applicants = groups.setdefault(key, OrderedDict())
+        applicants.setdefault(test_case.external_id, []).append(test_case)
+    batches = []
+    for applicants in groups.values():
+        chunks = list(applicants.values())
+        for i in range(0, len(chunks), max_keys):
+            batches.append([c for chunk in chunks[i : i + max_keys] for c in chunk])
+    return batches
+
+
+def column_key(test_case: BaseTestCase) -> tuple:
+    """
+    Identifies the value a case selects in a set query. Exports that take the
+    field as a bind parameter share their sql text, so the params count too.
+    """
+    params = tuple(sorted(test_case.export_params.items()))
+    return test_case.sql_export, params
+
+
+def set_sql(test_cases: List[BaseTestCase]) -> Tuple[str, dict, Dict[str, int]]:
+    """
+    Builds a single query answering every case in a destination group.
+
+    Returns the sql and its bind parameters along with the position of each
+    distinct column in the result rows, by `column_key`.
+    """
+    positions = OrderedDict()
+    columns = []
+    params = {}
+    for test_case in test_cases:
+        key = column_key(test_case)
+        if key not in positions:
+            column, export_params = prefixed_column(test_case, len(columns))
+            positions[key] = len(positions) + 1
+            columns.append(column)
+            params.update(export_params)
+    keys = list(OrderedDict.fromkeys(c.external_id for c in test_cases))
+    params.update({f"key_{i}": key for i, key in enumerate(keys)})
+    sql = test_cases[0].build_set_sql(",\n    ".join(columns), len(keys))
+    return sql, params, positions
+
+
+def execute_set(db, test_cases: List[BaseTestCase]) -> None:
+    """
+    Executes a destination group as one query and demultiplexes the rows
+    back onto each case by applicant.
+
+    If the set query fails, the group falls back to per-applicant batches.
+    """
+    if len({c.external_id for c in test_cases}) == 1:
+        execute_batch(db, test_cases)
+        return
+    timer = QueryTimer()
+    sql, params, positions = set_sql(test_cases)
+    timer.lap("build")
+    try:
+        result = db.execute(text(sql), params)
+        timer.lap("execute")
+        rows = result.fetchall()
+    except (DatabaseError, ProgrammingError) as e:
+        if is_timeout(e):
+            for test_case in test_cases:
+                test_case.store_error(e)
+            return
+        for batch in group_by_applicant(test_cases):
+            execute_batch(db, batch)
+    else:
+        timer.lap("fetch")
+        rows_by_key = {str(row[0]): row for row in rows}
+        for test_case in test_cases:
+            row = rows_by_key.get(str(test_case.external_id))
+            test_case.store_row_value(row, positions[column_key(test_case)])
+            test_case.record_timings(timer, len(test_cases))
@@ -0,0 +1,59 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Tuple
+
+
+class ResultCache:
+    """
+    An LRU cache of query results that expire after `ttl` seconds.
+
+    Entries are tagged with the external id they belong to so that every
+    result for an applicant can be invalidated at once.
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 10000, clock=time.monotonic):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.clock = clock
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """Returns a tuple of whether `key` was found and its cached value."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, external_id, stored_at = entry
+            if self.clock() - stored_at < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, value
+            del self._entries[key]
+        self.misses += 1
+        return False, None
+
+    def set(self, key: Hashable, value: Any, external_id: str = None) -> None:
+        self._entries[key] = (value, external_id, self.clock())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, external_id: str) -> int:
+        """Removes every entry for `external_id`, returning the number removed."""
+        keys = [k for k, v in self._entries.items() if v[1] == external_id]
+        for key in keys:
+            del self._entries[key]
+        return len(keys)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def reset_stats(self) -> None:
+        self.hits = 0
+        self.misses = 0
+
+    def report(self) -> str:
+        return f"Result cache: {self.hits} hits, {self.misses} misses, {len(self)} entries"
@@ -1,16 +1,25 @@
-import sys
 import traceback
 from datetime import date, datetime
 from textwrap import dedent
 
+from sqlalchemy import text
 from sqlalchemy.exc import DatabaseError, ProgrammingError
 
+from .timeouts import is_timeout
+from .timing import QueryTimer
+
+NOT_FOUND = "### DOES NOT EXIST ###"
+
 
 class BaseTestCase:
 
     record = "base"
     base = "a"
     join_clause = ""
+    key_column = "a.[external_id]"
+    key_param = "external_id"
+    # a LookupCache, when set lookup columns are decoded client side
+    lookups = None
 
     def __init__(
         self,
@@ -32,6 +41,11 @@ class BaseTestCase:
         self._status = kwargs.get("status")
         self._executed = False
         self._exc = None
+        self.bind_prefix = ""
+        self.timings = {}
+        self.batch_size = 1
+        # when the applicant's source record last changed, if known
+        self.marker = None
 
     def __repr__(self) -> str:
         return f"<{self.__class__.__name__} idx={self.idx}>"
@@ -41,20 +55,107 @@ class BaseTestCase:
         return f"{self.base}.[{self.field}]"
 
     @property
-    def sql(self) -> str:
+    def lookup_tables(self) -> list:
+        """The lookup tables that decode this case's raw column, in order."""
+        return []
+
+    @property
+    def decodes_lookups(self) -> bool:
+        return self.lookups is not None and bool(self.lookup_tables)
+
+    def bind_name(self, name: str) -> str:
+        """Names a bind parameter, prefixed so batched cases don't collide."""
+        return f"{self.bind_prefix}{name}"
+
+    @property
+    def export_params(self) -> dict:
+        """Bind parameters referenced by `sql_export`."""
+        return {}
+
+    @property
+    def params(self) -> dict:
+        return {self.key_param: self.external_id, **self.export_params}
+
+    @property
+    def sql_filters(self) -> str:
+        # colons would otherwise be read as bind parameters
+        return self.filters.replace(":", "\\:")
+
+    @property
+    def batch_key(self) -> tuple:
+        """Cases sharing a key can be answered from the same result row."""
+        return (self.__class__, self.external_id, self.filters)
+
+    def select_column(self, alias: str) -> str:
+        return f"{self.sql_export} as [{alias}]"
+
+    def build_sql(self, columns: str) -> str:
         sql = f"""\
         select top 1
-          {self.sql_export} as [actual]
+          {columns}
         from application a
         join person p on a.[person] = p.[id]
         {self.join_clause}
         where
-          a.[external_id] = '{self.external_id}'
+          {self.key_column} = :{self.key_param}
+        """
+        if self.filters:
+            sql += f" and {self.sql_filters}"
+        return dedent(sql)
+
+    def build_set_sql(self, columns: str, key_count: int) -> str:
+        """
+        Builds a query answering `columns` for `key_count` applicants at once,
+        bound as `key_0` through `key_n`, returning the first matching row per
+        applicant.
+        """
+        values = ", ".join(f"(:key_{i})" for i in range(key_count))
+        sql = f"""\
+        select *
+        from (
+          select
+            k.[key],
+            {columns},
+            row_number() over (partition by k.[key] order by (select null)) as [rn]
+          from application a
+          join (values {values}) as k ([key]) on {self.key_column} = k.[key]
+          join person p on a.[person] = p.[id]
+          {self.join_clause}
         """
         if self.filters:
-            sql += f" and {self.filters}"
+            sql += f" where {self.sql_filters}"
+        return dedent(sql) + "\n) x\nwhere x.[rn] = 1"
+
+    @classmethod
+    def build_exists_sql(cls, key_count: int) -> str:
+        """Builds a query returning which of `key_count` applicants exist."""
+        keys = ", ".join(f":key_{i}" for i in range(key_count))
+        sql = f"""\
+        select distinct {cls.key_column}
+        from application a
+        where {cls.key_column} in ({keys})
+        """
         return dedent(sql)
 
+    @classmethod
+    def build_marker_sql(cls, key_count: int) -> str:
+        """
+        Builds a query returning when each of `key_count` applicants was last
+        updated, bound as `key_0` through `key_n`.
+        """
+        keys = ", ".join(f":key_{i}" for i in range(key_count))
+        sql = f"""\
+        select a.[external_id], max(a.[updated])
+        from application a
+        where a.[external_id] in ({keys})
+        group by a.[external_id]
+        """
+        return dedent(sql)
+
+    @property
+    def sql(self) -> str:
+        return self.build_sql(self.select_column("actual"))
+
     def store_result(self, actual) -> None:
         if isinstance(actual, datetime):
             actual = actual.strftime("%Y-%m-%d %H:%M:%S")
@@ -82,7 +183,7 @@ class BaseTestCase:
             return True
         # allows for shorthand existence checking
         if self.expected == "### EXISTS ###":
-            return self.actual != "### DOES NOT EXIST ###"
+            return self.actual != NOT_FOUND
         converted = equivalencies.get(str(self.actual), self.actual)
         if isinstance(converted, datetime):
             converted = converted.strftime("%Y-%m-%d %H:%M:%S")
@@ -113,50 +214,127 @@ class BaseTestCase:
             "filters": self.filters,
         }
 
+    @property
+    def executed(self) -> bool:
+        return self._executed
+
     @property
     def status(self) -> str:
         if self._exc:
-            return "Error"
+            return "Timeout" if is_timeout(self._exc) else "Error"
         if self._executed:
             if self.passed:
                 return "Pass"
             return "Fail"
         return "Untested"
 
+    def convert_result(self, value):
+        if isinstance(value, (datetime, date)):
+            return value.strftime("%Y-%m-%d %H:%M:%S")
+        if isinstance(value, bool):
+            return "1" if value is True else "0"
+        return value
+
+    def store_row_value(self, row, position=0) -> None:
+        if row is None:
+            self.store_result(NOT_FOUND)
+        else:
+            value = row[position]
+            if self.decodes_lookups:
+                value = self.lookups.decode(self.lookup_tables, value)
+            self.store_result(self.convert_result(value))
+
+    def store_error(self, exc: Exception) -> None:
+        exception = traceback.format_exception(
+            type(exc), exc, exc.__traceback__, chain=True
+        )
+        actual = next(filter(lambda x: not x.startswith(" "), exception[1:])).strip()
+        self._exc = exc
+        self.store_result(actual)
+
+    def copy_result(self, other: "BaseTestCase") -> None:
+        """Shares the result of a case that ran the same query."""
+        self.actual = other.actual
+        self._executed = other._executed
+        self._exc = other._exc
+
+    @property
+    def duration(self):
+        """Total seconds spent building, executing and fetching, if executed."""
+        if not self.timings:
+            return None
+        return sum(self.timings.values())
+
+    def record_timings(self, timer: QueryTimer, batch_size: int = 1) -> None:
+        """Records a query's timings, split evenly across the cases it answered."""
+        self.timings = {k: v / batch_size for k, v in timer.timings.items()}
+        self.batch_size = batch_size
+
     def execute(self, db) -> None:
+        timer = QueryTimer()
+        sql, params = text(self.sql), self.params
+        timer.lap("build")
         try:
-            result = db.execute(self.sql).first()
+            result = db.execute(sql, params)
+            timer.lap("execute")
+            row = result.first()
         except (DatabaseError, ProgrammingError) as e:
-            type_, value_, traceback_ = sys.exc_info()
-            exception = traceback.format_exception(
-                type_, value_, traceback_, chain=True
-            )
-            actual = next(
-                filter(lambda x: not x.startswith(" "), exception[1:])
-            ).strip()
-            self._exc = e
+            timer.lap("execute")
+            self.store_error(e)
         else:
-            if result is None:
-                actual = "### DOES NOT EXIST ###"
-            elif isinstance(result.actual, (datetime, date)):
-                actual = result.actual.strftime("%Y-%m-%d %H:%M:%S")
-            elif isinstance(result.actual, bool):
-                actual = "1" if result.actual is True else "0"
-            else:
-                actual = result.actual
-        finally:
-            self.store_result(actual)
+            timer.lap("fetch")
+            self.store_row_value(row)
+        self.record_timings(timer)
+
+
+field_functions = {
+    "": "dbo.getfieldextendedmultitable",
+    "export 1": "dbo.getfieldexportmultitable",
+    "export 2": "dbo.getfieldexport2multitable",
+}
+
+
+def field_value_sql(base: str, export: str, field: str) -> str:
+    """Aggregates the values of a custom field for the record `base`."""
+    function = field_functions[export.lower()]
+    return f"(select string_agg([value], ', ') within group (order by [value]) from {function}({base}.[id], {field}))"
 
 
 class FieldTestCase(BaseTestCase):
+    @property
+    def export_params(self) -> dict:
+        return {self.bind_name("field"): self.field}
+
     @property
     def sql_export(self) -> str:
-        exports = {
-            "": f"(select string_agg([value], ', ') within group (order by [value]) from dbo.getfieldextendedmultitable({self.base}.[id], '{self.field}'))",
-            "export 1": f"(select string_agg([value], ', ') within group (order by [value]) from dbo.getfieldexportmultitable({self.base}.[id], '{self.field}'))",
-            "export 2": f"(select string_agg([value], ', ') within group (order by [value]) from dbo.getfieldexport2multitable({self.base}.[id], '{self.field}'))",
-        }
-        return exports[self.export.lower()]
+        return field_value_sql(self.base, self.export, f":{self.bind_name('field')}")
+
+    @classmethod
+    def build_prefetch_sql(cls, export: str, key_count: int, field_count: int) -> str:
+        """
+        Builds a query answering `field_count` fields for `key_count`
+        applicants at once, bound as `key_0`... and `field_0`..., returning the
+        first matching row per applicant and field.
+        """
+        keys = ", ".join(f"(:key_{i})" for i in range(key_count))
+        fields = ", ".join(f"(:field_{i})" for i in range(field_count))
+        sql = f"""\
+        select *
+        from (
+          select
+            k.[key],
+            f.[field],
+            {field_value_sql(cls.base, export, "f.[field]")} as [value],
+            row_number() over (partition by k.[key], f.[field] order by (select null)) as [rn]
+          from application a
+          join (values {keys}) as k ([key]) on {cls.key_column} = k.[key]
+          join person p on a.[person] = p.[id]
+          {cls.join_clause}
+          cross join (values {fields}) as f ([field])
+        ) x
+        where x.[rn] = 1
+        """
+        return dedent(sql)
 
 
 class ApplicationActivity(BaseTestCase):
@@ -175,8 +353,18 @@ class Application(BaseTestCase):
     base = "a"
     record = "application"
 
+    @property
+    def lookup_tables(self) -> list:
+        tables = {
+            "round": ["lookup.round"],
+            "period": ["lookup.round.period", "lookup.period"],
+        }
+        return tables.get(self.field, [])
+
     @property
     def sql_export(self) -> str:
+        if self.decodes_lookups:
+            return "a.[round]"
         if self.field == "round":
             return "(select [name] from [lookup.round] where [id] = a.[round])"
         if self.field == "period":
@@ -212,31 +400,33 @@ class Interest(BaseTestCase):
     record = "interests"
     join_clause = "join [interest] int on int.[record] = p.[id]"
 
+    record_fields = [
+        "name",
+        "from",
+        "to",
+        "frequency",
+        "description",
+        "rank",
+        "role",
+        "city",
+        "region",
+        "country",
+        "type",
+        "frequency_hrs",
+        "frequency_wks",
+    ]
+
     @property
     def sql_export(self) -> str:
-        record_fields = [
-            "name",
-            "from",
-            "to",
-            "frequency",
-            "description",
-            "rank",
-            "role",
-            "city",
-            "region",
-            "country",
-            "type",
-            "frequency_hrs",
-            "frequency_wks",
-        ]
-        exports = {
-            "": f"(select string_agg([value], ', ') within group (order by [value]) from dbo.getfieldextendedmultitable({self.base}.[id], '{self.field}'))",
-            "export 1": f"(select string_agg([value], ', ') within group (order by [value]) from dbo.getfieldexportmultitable({self.base}.[id], '{self.field}'))",
-            "export 2": f"(select string_agg([value], ', ') within group (order by [value]) from dbo.getfieldexport2multitable({self.base}.[id], '{self.field}'))",
-        }
-        if self.field in record_fields:
+        if self.field in self.record_fields:
             return super().sql_export
-        return exports[self.export.lower()]
+        return field_value_sql(self.base, self.export, f":{self.bind_name('field')}")
+
+    @property
+    def export_params(self) -> dict:
+        if self.field in self.record_fields:
+            return {}
+        return {self.bind_name("field"): self.field}
 
 
 class InterestField(FieldTestCase):
@@ -266,10 +456,16 @@ class Relation(BaseTestCase):
     record = "relation"
     join_clause = "join [relation] r on r.[record] = p.[id]"
 
+    @property
+    def lookup_tables(self) -> list:
+        if self.field in ["education_level", "type"]:
+            return ["lookup.prompt"]
+        return []
+
     @property
     def sql_export(self) -> str:
         overridden_fields = ["education_level", "type"]
-        if self.field in overridden_fields:
+        if self.field in overridden_fields and not self.decodes_lookups:
             return (
                 f"(select [value] from [lookup.prompt] where [id] = r.[{self.field}])"
             )
@@ -305,10 +501,16 @@ class School(BaseTestCase):
     record = "school"
     join_clause = "join school s on s.[record] = p.[id]"
 
+    @property
+    def lookup_tables(self) -> list:
+        if self.field == "degree":
+            return ["lookup.prompt"]
+        return []
+
     @property
     def sql_export(self) -> str:
         export = super().sql_export
-        if self.field == "degree":
+        if self.field == "degree" and not self.decodes_lookups:
             return f"(select [value] from [lookup.prompt] where [id] = {export})"
         if self.field == "type":
             return f"case {export} when 'H' then 'High School' when 'U' then 'Undergraduate' when 'G' then 'Graduate' else null end"
@@ -379,30 +581,32 @@ class Job(BaseTestCase):
     join_clause = "join [job] j on j.[record] = p.[id]"
 
 
+destinations = {
+    "activity": ApplicationActivity,
+    "address": Address,
+    "application": Application,
+    "application field": ApplicationField,
+    "awards (capx)": CommonAppTransferAward,
+    "cbos": CBO,
+    "device": Device,
+    "honors (capx)": CommonAppTansferHonor,
+    "honors & awards": HonorsAndAwards,
+    "job": Job,
+    "interests": Interest,
+    "interests field": InterestField,
+    "person": Person,
+    "person field": PersonField,
+    "school": School,
+    "relationship": Relation,
+    "relationship address": RelationAddress,
+    "relationship field": RelationField,
+    "relationship job": RelationJob,
+    "relationship school": RelationSchool,
+    "relative employee": RelativeEmployee,
+    "test scores": TestScore,
+}
+
+
 def build_case(destination: str, **kwargs) -> BaseTestCase:
-    destinations = {
-        "activity": ApplicationActivity,
-        "address": Address,
-        "application": Application,
-        "application field": ApplicationField,
-        "awards (capx)": CommonAppTransferAward,
-        "cbos": CBO,
-        "device": Device,
-        "honors (capx)": CommonAppTansferHonor,
-        "honors & awards": HonorsAndAwards,
-        "job": Job,
-        "interests": Interest,
-        "interests field": InterestField,
-        "person": Person,
-        "person field": PersonField,
-        "school": School,
-        "relationship": Relation,
-        "relationship address": RelationAddress,
-        "relationship field": RelationField,
-        "relationship job": RelationJob,
-        "relationship school": RelationSchool,
-        "relative employee": RelativeEmployee,
-        "test scores": TestScore,
-    }
     destination_class = destinations[destination.lower()]
     return destination_class(**kwargs)
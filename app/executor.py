@@ -1,36 +1,174 @@
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from typing import List
 
 from sqlalchemy import create_engine
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.exc import DatabaseError, ProgrammingError
 
+from .batching import (
+    execute_batch,
+    execute_set,
+    group_by_applicant,
+    group_by_destination,
+)
+from .cache import ResultCache
 from .cases import build_case
+from .lookups import LookupCache
+from .oracle import install_prefetch
+from .ordering import CaseOrder
+from .plans import capture_plan
+from .prefetch import FieldPrefetch
+from .probe import ExistenceProbe
 from .ps_cases import build_case as ps_build_case
+from .snapshots import SnapshotStage
+from .store import SKIPPABLE_STATUSES, ResultStore, fetch_markers
+from .streaming import StreamingPublisher
+from .timeouts import install_timeouts
+from .timing import TimingReport
+
+RETEST_STATUSES = ["Untested", "Fail", "Error", "Timeout"]
+
+# guards engine creation, which worker threads and executors sharing engines
+# can race on
+engine_lock = threading.Lock()
 
 
 class TestExecutor:
-    def __init__(self, config, publisher):
+    def __init__(self, config, publisher, engines=None):
         self.config = config
         self._db = None
+        # engines shared with other executors, by url
+        self.engines = engines
         self.publisher = publisher
         self.results = []
         self.test_cases = []
+        self.stream = None
         self.case_builder = (
             ps_build_case
             if config.TEST_PLAN == "peoplesoft" or config.TEST_MODE == "peoplesoft"
             else build_case
         )
+        self.cache = (
+            ResultCache(config.RESULT_CACHE_TTL, config.RESULT_CACHE_SIZE)
+            if config.RESULT_CACHE_TTL
+            else None
+        )
+        self.timing = self.new_timing_report()
+        self.counts = Counter()
+        self.untested = 0
+        self.skipped = 0
+        self.deduplicated = 0
+        # workers of every executor sharing this one's engine, if it's shared
+        self.pool_workers = None
+        # when the current run stops starting batches, if it has a budget
+        self.deadline = None
+        # cases the current run ran out of time for
+        self.deferred = []
+        # rows deferred by the last run, which run first in this one
+        self.carried_over = set()
+        self.case_order = CaseOrder.parse(config.CASE_ORDER)
+        # fails fast on unknown orders
+        CaseOrder(self.case_order)
+        self.order = None
+        # mean seconds per case by destination, as of the last run that timed it
+        self.latencies = {}
+        # duplicates waiting on the case that runs their query, by case id
+        self.duplicates = {}
+        self._lookups = None
+        self.store = (
+            ResultStore(config.RESULT_STORE, config.TEST_PLAN)
+            if config.RESULT_STORE
+            else None
+        )
+        self.run_id = None
+
+    @property
+    def db_url(self):
+        if self.config.TEST_MODE == "peoplesoft":
+            return self.config.PS_DB_URL
+        return self.config.DB_URL
+
+    def engine_options(self) -> dict:
+        options = {"echo": self.config.DEBUG}
+        backend = make_url(self.db_url).get_backend_name()
+        workers = self.pool_workers or self.config.WORKERS
+        if workers > 1 and backend != "sqlite":
+            # one pooled connection per worker so no worker waits on checkout
+            options.update(pool_size=workers, max_overflow=0)
+        if backend == "oracle":
+            # read a set query in one fetch, with numbers as native floats
+            # rather than a Decimal per value
+            options.update(
+                arraysize=self.config.FETCH_ARRAYSIZE, coerce_to_decimal=False
+            )
+        return options
 
     @property
     def db(self):
         if self._db is None:
-            if self.config.TEST_MODE == "peoplesoft":
-                db_url = self.config.PS_DB_URL
-            else:
-                db_url = self.config.DB_URL
-            self._db = create_engine(db_url, echo=self.config.DEBUG)
+            with engine_lock:
+                if self._db is None:
+                    self._db = self.create_db()
         return self._db
 
-    def add_result(self, test_case):
-        self.results.append(test_case)
+    def create_db(self):
+        if self.engines is not None and self.db_url in self.engines:
+            return self.engines[self.db_url]
+        db = create_engine(self.db_url, **self.engine_options())
+        if self.config.QUERY_TIMEOUT:
+            install_timeouts(db, self.config.QUERY_TIMEOUT)
+        if db.dialect.name == "oracle":
+            install_prefetch(db, self.config.FETCH_ARRAYSIZE)
+        if self.engines is not None:
+            self.engines[self.db_url] = db
+        return db
+
+    @property
+    def lookups(self):
+        if self._lookups is None and self.config.LOOKUP_CACHE:
+            self._lookups = LookupCache(self.db, self.config.LOOKUP_CACHE_TTL)
+        return self._lookups
+
+    def new_timing_report(self):
+        return TimingReport(
+            self.config.SLOW_CASE_THRESHOLD, self.config.TIMING_REPORT_SIZE
+        )
+
+    def add_result(self, test_case, cached=False):
+        self.counts[test_case.status] += 1
+        if not cached:
+            self.timing.add(test_case)
+        if self.cache is not None and not cached:
+            self.cache_result(test_case)
+        if self.store is not None:
+            self.store.record(self.run_id, test_case)
+        if self.stream is not None:
+            self.stream.put(test_case)
+        else:
+            self.results.append(test_case)
+        for duplicate in self.duplicates.pop(id(test_case), []):
+            duplicate.copy_result(test_case)
+            self.add_result(duplicate, cached=True)
+
+    def cache_key(self, test_case):
+        params = tuple(sorted(test_case.params.items()))
+        # decoded cases can share sql, e.g. application round and period
+        lookups = tuple(test_case.lookup_tables) if test_case.decodes_lookups else ()
+        return (test_case.sql, params, lookups, self.db_url)
+
+    def cache_result(self, test_case):
+        if test_case.executed and test_case.status not in ("Error", "Timeout"):
+            self.cache.set(
+                self.cache_key(test_case), test_case.actual, test_case.external_id
+            )
+
+    def invalidate_cache(self, external_id):
+        if self.cache is not None:
+            self.cache.invalidate(external_id)
 
     def reset_results(self):
         self.results = []
@@ -38,25 +176,265 @@ class TestExecutor:
     def add_test_case(self, test_case):
         self.test_cases.append(test_case)
 
-    def get_test_cases(self, statuses=["Untested", "Fail", "Error"], filter_func=None):
+    def get_test_cases(self, statuses=RETEST_STATUSES, filter_func=None):
         raw_cases = self.publisher.get_cases(statuses, filter_func)
+        self.untested = sum(1 for case in raw_cases if case["status"] == "Untested")
         self.test_cases = [self.case_builder(**case) for case in raw_cases]
+        if self.case_order:
+            self.order = CaseOrder(
+                self.case_order,
+                getattr(self.publisher, "changed_rows", ()),
+                self.latencies,
+            )
+        if self.lookups is not None:
+            if not self.config.LOOKUP_CACHE_TTL:
+                # without a ttl, lookups are reloaded once per run
+                self.lookups.clear()
+            for test_case in self.test_cases:
+                test_case.lookups = self.lookups
 
     def execute_case(self, test_case):
         test_case.execute(self.db)
         self.add_result(test_case)
 
+    def execute_batch(self, test_cases):
+        for test_case in self.run_batch(test_cases):
+            self.add_result(test_case)
+
+    def run_batch(self, test_cases):
+        """
+        Executes a batch of test cases without recording results, so it can be
+        called from worker threads.
+
+        Unexpected errors are stored on the cases of the failing batch rather
+        than aborting the run. Once the run is out of time the batch is
+        deferred to the next run and no cases are returned.
+        """
+        if self.out_of_time():
+            self.defer(test_cases)
+            return []
+        try:
+            if self.config.SET_BASED:
+                execute_set(self.db, test_cases)
+            else:
+                execute_batch(self.db, test_cases)
+        except Exception as e:
+            for test_case in test_cases:
+                if not test_case.executed:
+                    test_case.store_error(e)
+        return test_cases
+
+    def out_of_time(self) -> bool:
+        return self.deadline is not None and time.monotonic() > self.deadline
+
+    def defer(self, test_cases):
+        """Leaves cases, and the duplicates waiting on them, to the next run."""
+        for test_case in test_cases:
+            self.deferred.append(test_case)
+            self.deferred.extend(self.duplicates.get(id(test_case), []))
+
+    def prioritize(self, test_cases):
+        """
+        Sorts cases by CASE_ORDER, then moves the rows the last run deferred
+        to the front so a run that always hits its budget still reaches them.
+        """
+        if self.order is not None:
+            test_cases = self.order.sort(test_cases)
+        if self.carried_over:
+            test_cases = sorted(
+                test_cases, key=lambda c: str(c.idx) not in self.carried_over
+            )
+        return test_cases
+
+    def pending_cases(self):
+        """
+        Resolves what can be answered without querying the database and returns
+        the test cases that still need to be executed.
+
+        Bulk stages aren't started once the run is out of time; the cases they
+        would have answered are deferred along with the rest.
+        """
+        # before deduplicating, so the highest priority case runs the query
+        pending = self.prioritize(self.test_cases)
+        if self.order is not None:
+            print(self.order.report())
+        if self.carried_over:
+            print(f"Running {len(self.carried_over)} rows deferred last run first")
+        if self.store is not None and not self.out_of_time():
+            pending = self.skip_unchanged(pending)
+        if self.config.DEDUPE_CASES:
+            pending = self.deduplicate(pending)
+        if self.cache is not None:
+            cases, pending = pending, []
+            for test_case in cases:
+                hit, actual = self.cache.get(self.cache_key(test_case))
+                if hit:
+                    test_case.store_result(actual)
+                    self.add_result(test_case, cached=True)
+                else:
+                    pending.append(test_case)
+        for stage in self.prefetch_stages():
+            if self.out_of_time():
+                break
+            answered, pending = stage.resolve(pending)
+            for test_case in answered:
+                self.add_result(test_case)
+            print(stage.report())
+        return pending
+
+    def deduplicate(self, test_cases):
+        """
+        Collapses cases that generate the same query into the first of them,
+        whose result is shared with the rest once it's added.
+        """
+        unique = OrderedDict()
+        for test_case in test_cases:
+            first = unique.setdefault(self.cache_key(test_case), test_case)
+            if first is not test_case:
+                self.duplicates.setdefault(id(first), []).append(test_case)
+        self.deduplicated = len(test_cases) - len(unique)
+        print(f"Deduplicated {len(test_cases)} cases into {len(unique)} queries")
+        return list(unique.values())
+
+    def skip_unchanged(self, test_cases):
+        """
+        Drops failing cases whose row and applicant haven't changed since the
+        result store last saw them fail, leaving the sheet as it is.
+        """
+        # only cases the sheet shows as failing can be skipped
+        candidates = [c for c in test_cases if c._status in SKIPPABLE_STATUSES]
+        try:
+            fetch_markers(self.db, candidates, self.config.SET_SIZE)
+        except (DatabaseError, ProgrammingError) as e:
+            print(f"Couldn't read update markers, rerunning every case: {e}")
+            return test_cases
+        unchanged = set(map(id, self.store.unchanged(test_cases)))
+        self.skipped = len(unchanged)
+        print(f"Skipped {self.skipped} unchanged failing cases")
+        return [c for c in test_cases if id(c) not in unchanged]
+
+    def prefetch_stages(self):
+        """Stages that answer groups of cases in bulk before batching."""
+        stages = []
+        if self.config.EXISTENCE_PROBE:
+            stages.append(ExistenceProbe(self.db, self.config.SET_SIZE))
+        if self.case_builder is ps_build_case:
+            if self.config.PS_SNAPSHOTS:
+                stages.append(SnapshotStage(self.db, self.config.SET_SIZE))
+        elif self.config.FIELD_PREFETCH:
+            stages.append(FieldPrefetch(self.db, self.config.SET_SIZE))
+        return stages
+
+    def plan_batches(self):
+        # bulk stages hand back their leftovers grouped by destination
+        test_cases = self.prioritize(self.pending_cases())
+        if self.config.SET_BASED:
+            return group_by_destination(test_cases, self.config.SET_SIZE)
+        if self.config.BATCH_CASES:
+            return group_by_applicant(test_cases, self.config.BATCH_SIZE)
+        return [[test_case] for test_case in test_cases]
+
     def run_tests(self):
-        for test_case in self.test_cases:
-            self.execute_case(test_case)
+        batches = self.plan_batches()
+        if self.config.WORKERS > 1:
+            with ThreadPoolExecutor(max_workers=self.config.WORKERS) as pool:
+                # map yields in submission order, keeping results deterministic
+                for test_cases in pool.map(self.run_batch, batches):
+                    for test_case in test_cases:
+                        self.add_result(test_case)
+        else:
+            for batch in batches:
+                self.execute_batch(batch)
+
+    def capture_plans(self):
+        """
+        Captures the query plan of the slowest case for each destination and
+        field that crossed SLOW_CASE_THRESHOLD this run.
+        """
+        slowest = {}
+        for test_case in self.timing.slow:
+            key = (test_case.__class__.__name__, test_case.field)
+            if key not in slowest or test_case.duration > slowest[key].duration:
+                slowest[key] = test_case
+        for test_case in slowest.values():
+            capture_plan(self.db, test_case, self.config.PLAN_ARTIFACTS_DIR)
+        if slowest:
+            print(
+                f"Captured {len(slowest)} query plans in "
+                f"{self.config.PLAN_ARTIFACTS_DIR}"
+            )
 
     def publish(self, reset=True):
         self.publisher.publish(self.results)
         if reset:
             self.reset_results()
 
+    @contextmanager
+    def streaming(self):
+        """
+        Publishes results from a background thread as they are added instead
+        of holding them until the end of the run.
+        """
+        self.stream = StreamingPublisher(
+            self.publisher,
+            flush_size=self.config.PUBLISH_BATCH_SIZE,
+            flush_interval=self.config.PUBLISH_INTERVAL,
+            queue_size=self.config.PUBLISH_QUEUE_SIZE,
+        )
+        try:
+            yield self.stream
+        finally:
+            stream, self.stream = self.stream, None
+            stream.close()
+
+    def run_and_publish(self):
+        if self.config.STREAM_PUBLISH:
+            with self.streaming():
+                self.run_tests()
+        else:
+            self.run_tests()
+            self.publish()
+
     def run(self, filter_func=None, statuses: List[str] = None):
-        statuses = statuses or ["Untested", "Fail", "Error"]
+        statuses = statuses or RETEST_STATUSES
+        start = time.monotonic()
+        if self.config.RUN_TIME_BUDGET:
+            self.deadline = start + self.config.RUN_TIME_BUDGET
+        self.timing = self.new_timing_report()
+        self.counts = Counter()
+        self.skipped = 0
+        self.deduplicated = 0
+        self.duplicates = {}
+        self.deferred = []
+        if self.store is not None:
+            self.run_id = self.store.start_run()
         self.get_test_cases(statuses, filter_func)
-        self.run_tests()
-        self.publish()
+        self.run_and_publish()
+        if self.config.TIMING_JSONL:
+            self.timing.write_jsonl(self.config.TIMING_JSONL)
+        if self.config.PLAN_ARTIFACTS_DIR:
+            self.capture_plans()
+        self.deadline = None
+        self.carried_over = {str(test_case.idx) for test_case in self.deferred}
+        for name, (count, total, _) in self.timing.destinations.items():
+            self.latencies[name] = total / count
+        summary = self.summary(time.monotonic() - start)
+        if summary["deferred"]:
+            print(f"Out of time, deferred {summary['deferred']} cases to the next run")
+        if self.store is not None:
+            self.store.commit()
+            self.store.finish_run(self.run_id, summary)
+        return summary
+
+    def summary(self, seconds: float) -> dict:
+        """Summarizes the last run, in a form shards can combine."""
+        return {
+            "cases": sum(self.counts.values()),
+            "untested": self.untested,
+            "skipped": self.skipped,
+            "deduplicated": self.deduplicated,
+            "deferred": len(self.deferred),
+            "statuses": dict(self.counts),
+            "seconds": seconds,
+            "destinations": dict(self.timing.destinations),
+        }
@@ -0,0 +1,53 @@
+import threading
+import time
+
+from sqlalchemy import text
+
+# each lookup maps its first column to its second
+LOOKUP_TABLES = {
+    "lookup.round": "select [id], [name] from [lookup.round]",
+    "lookup.round.period": "select [id], [period] from [lookup.round]",
+    "lookup.period": "select [id], [name] from [lookup.period]",
+    "lookup.prompt": "select [id], [value] from [lookup.prompt]",
+    "ps_country_tbl": "select country, descr from ps_country_tbl",
+}
+
+
+class LookupCache:
+    """
+    Small lookup tables loaded into dictionaries so that cases can select a
+    raw id or code and decode it client side.
+
+    Tables are loaded on first use and reloaded once they are older than
+    `ttl` seconds. A `ttl` of 0 keeps them until `clear` is called.
+    """
+
+    def __init__(self, db, ttl: float = 0, clock=time.monotonic):
+        self.db = db
+        self.ttl = ttl
+        self.clock = clock
+        self._tables = {}
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def table(self, name: str) -> dict:
+        with self._lock:
+            loaded = self._tables.get(name)
+            if loaded is None or (self.ttl and self.clock() - loaded[0] > self.ttl):
+                rows = self.db.execute(text(LOOKUP_TABLES[name])).fetchall()
+                values = {str(key): value for key, value in rows}
+                loaded = self._tables[name] = (self.clock(), values)
+                self.loads += 1
+            return loaded[1]
+
+    def decode(self, tables: list, value):
+        """Decodes `value` through each table in turn, like nested subqueries."""
+        for name in tables:
+            if value is None:
+                return None
+            value = self.table(name).get(str(value))
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._tables = {}
@@ -0,0 +1,14 @@
+from sqlalchemy import event
+
+
+def install_prefetch(engine, rows: int) -> None:
+    """
+    Has cx_Oracle return the first `rows` rows of every query with its
+    execute round trip, so a set query is read without a separate fetch.
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def set_prefetch(conn, cursor, statement, parameters, context, executemany):
+        # prefetchrows needs cx_Oracle 8
+        if hasattr(cursor, "prefetchrows"):
+            cursor.prefetchrows = rows + 1
@@ -0,0 +1,66 @@
+from typing import Dict, Iterable, List
+
+from .cases import BaseTestCase
+
+# the statuses whose results people are waiting on come first
+STATUS_PRIORITY = {"Error": 0, "Timeout": 1, "Fail": 2, "Untested": 3}
+
+
+def status_rank(order: "CaseOrder", test_case: BaseTestCase) -> int:
+    return STATUS_PRIORITY.get(test_case._status, len(STATUS_PRIORITY))
+
+
+def recent_rank(order: "CaseOrder", test_case: BaseTestCase) -> int:
+    return 0 if int(test_case.idx) in order.changed_rows else 1
+
+
+def latency_rank(order: "CaseOrder", test_case: BaseTestCase) -> float:
+    # destinations without a history run first so they get one
+    return order.latencies.get(test_case.__class__.__name__, 0.0)
+
+
+ORDERINGS = {
+    "status": status_rank,
+    "recent": recent_rank,
+    "latency": latency_rank,
+}
+
+
+class CaseOrder:
+    """
+    Sorts the cases left to query so the results people care about most reach
+    the sheet first.
+
+    `keys` name entries of `ORDERINGS`, most significant first; ties keep
+    sheet order.
+    """
+
+    def __init__(
+        self,
+        keys: List[str],
+        changed_rows: Iterable[int] = (),
+        latencies: Dict[str, float] = None,
+    ):
+        unknown = [key for key in keys if key not in ORDERINGS]
+        if unknown:
+            raise ValueError(
+                f"Unknown case orders: {', '.join(unknown)} "
+                f"(expected {', '.join(ORDERINGS)})"
+            )
+        self.keys = keys
+        self.changed_rows = set(changed_rows)
+        self.latencies = latencies or {}
+
+    @staticmethod
+    def parse(value: str) -> List[str]:
+        """Parses a comma-separated list such as `status,recent`."""
+        return [key.strip() for key in (value or "").split(",") if key.strip()]
+
+    def key(self, test_case: BaseTestCase) -> tuple:
+        return tuple(ORDERINGS[key](self, test_case) for key in self.keys)
+
+    def sort(self, test_cases: List[BaseTestCase]) -> List[BaseTestCase]:
+        return sorted(test_cases, key=self.key)
+
+    def report(self) -> str:
+        return f"Ordered cases by {', '.join(self.keys)}"
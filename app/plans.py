@@ -0,0 +1,97 @@
+import json
+import os
+import re
+import uuid
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.exc import DatabaseError, ProgrammingError
+
+from .cases import BaseTestCase
+
+PLAN_EXTENSIONS = {"mssql": "sqlplan", "oracle": "txt", "sqlite": "txt"}
+
+
+def explain(db, sql: str, params: dict) -> Optional[str]:
+    """
+    Returns the execution plan the database would use for `sql`, or None if
+    plans can't be captured for its dialect.
+
+    SQL Server returns the showplan xml, Oracle the `dbms_xplan` output and
+    SQLite its query plan.
+    """
+    dialect = db.dialect.name
+    if dialect not in PLAN_EXTENSIONS:
+        return None
+    with db.connect() as conn:
+        if dialect == "mssql":
+            # with showplan on, statements are compiled but not executed
+            conn.execute(text("set showplan_xml on"))
+            try:
+                rows = conn.execute(text(sql), params).fetchall()
+            finally:
+                conn.execute(text("set showplan_xml off"))
+            return "".join(row[0] for row in rows)
+        if dialect == "oracle":
+            statement_id = uuid.uuid4().hex[:30]
+            conn.execute(
+                text(f"explain plan set statement_id = '{statement_id}' for {sql}"),
+                params,
+            )
+            rows = conn.execute(
+                text(
+                    "select plan_table_output from "
+                    "table(dbms_xplan.display('PLAN_TABLE', :statement_id, 'TYPICAL'))"
+                ),
+                {"statement_id": statement_id},
+            )
+            return "\n".join(row[0] for row in rows)
+        if dialect == "sqlite":
+            rows = conn.execute(text(f"explain query plan {sql}"), params)
+            return "\n".join(str(row[-1]) for row in rows)
+
+
+def artifact_name(value: str) -> str:
+    return re.sub(r"[^\w.-]+", "_", str(value)).strip("_") or "_"
+
+
+def capture_plan(db, test_case: BaseTestCase, directory: str) -> str:
+    """
+    Captures the plan for a test case's query and stores it with the case
+    result under `directory/<destination>/<field>`. Returns the path of the
+    result file.
+    """
+    destination = test_case.__class__.__name__
+    folder = os.path.join(directory, artifact_name(destination))
+    os.makedirs(folder, exist_ok=True)
+    base = os.path.join(folder, artifact_name(test_case.field))
+    record = {
+        "idx": test_case.idx,
+        "destination": destination,
+        "field": test_case.field,
+        "external_id": test_case.external_id,
+        "status": test_case.status,
+        "actual": test_case.actual,
+        "duration": test_case.duration,
+        "timings": test_case.timings,
+        "sql": test_case.sql,
+        "params": test_case.params,
+        "captured_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    try:
+        plan = explain(db, test_case.sql, test_case.params)
+    except (DatabaseError, ProgrammingError) as e:
+        record["plan_error"] = str(e)
+    else:
+        if plan is None:
+            record["plan_error"] = f"Plans can't be captured for {db.dialect.name}"
+        else:
+            plan_path = f"{base}.{PLAN_EXTENSIONS[db.dialect.name]}"
+            with open(plan_path, "w") as f:
+                f.write(plan)
+            record["plan"] = os.path.basename(plan_path)
+    path = f"{base}.json"
+    with open(path, "w") as f:
+        json.dump(record, f, indent=2, default=str)
+    return path
@@ -0,0 +1,83 @@
+from collections import OrderedDict
+from typing import List
+
+from sqlalchemy import text
+from sqlalchemy.exc import DatabaseError, ProgrammingError
+
+from .cases import BaseTestCase, FieldTestCase
+from .timing import QueryTimer
+
+
+class FieldPrefetch:
+    """
+    Answers Slate custom field cases from values prefetched for every
+    applicant and field in the run.
+
+    Cases are grouped by destination and export, and each group is fetched
+    with one query per `max_keys` applicants covering all of its fields, in
+    place of a scalar subquery per case.
+    """
+
+    def __init__(self, db, max_keys: int = 500):
+        self.db = db
+        self.max_keys = max_keys
+        self.queries = 0
+        self.answered = 0
+
+    def load(self, destination, export: str, keys: list, fields: list, timer) -> dict:
+        """Returns the value of each (key, field) pair that has a record."""
+        values = {}
+        field_params = {f"field_{i}": field for i, field in enumerate(fields)}
+        for start in range(0, len(keys), self.max_keys):
+            chunk = keys[start : start + self.max_keys]
+            sql = destination.build_prefetch_sql(export, len(chunk), len(fields))
+            params = {f"key_{i}": key for i, key in enumerate(chunk)}
+            params.update(field_params)
+            timer.lap("build")
+            result = self.db.execute(text(sql), params)
+            self.queries += 1
+            timer.lap("execute")
+            for key, field, value, _ in result:
+                values[(str(key), field)] = value
+            timer.lap("fetch")
+        return values
+
+    def resolve(self, test_cases: List[BaseTestCase]) -> tuple:
+        """
+        Stores results on the field cases that can be prefetched. Returns the
+        answered cases and the cases that still need to be executed.
+        """
+        groups = OrderedDict()
+        pending = []
+        for test_case in test_cases:
+            if isinstance(test_case, FieldTestCase) and not test_case.filters:
+                key = (type(test_case), test_case.export.lower())
+                groups.setdefault(key, []).append(test_case)
+            else:
+                pending.append(test_case)
+
+        answered = []
+        for (destination, export), cases in groups.items():
+            keys = list(OrderedDict.fromkeys(str(c.external_id) for c in cases))
+            fields = list(OrderedDict.fromkeys(c.field for c in cases))
+            timer = QueryTimer()
+            try:
+                values = self.load(destination, export, keys, fields, timer)
+            except (DatabaseError, ProgrammingError):
+                # fall back to querying each case
+                pending.extend(cases)
+                continue
+            for test_case in cases:
+                key = (str(test_case.external_id), test_case.field)
+                # no row means the applicant or the joined record doesn't exist
+                if key in values:
+                    test_case.store_row_value(values, key)
+                else:
+                    test_case.store_row_value(None)
+                test_case.record_timings(timer, len(cases))
+            answered.extend(cases)
+        self.answered += len(answered)
+        return answered, pending
+
+    def report(self) -> str:
+        return f"Prefetched {self.answered} field cases in {self.queries} queries"
@@ -0,0 +1,69 @@
+from collections import OrderedDict
+from typing import List
+
+from sqlalchemy import text
+from sqlalchemy.exc import DatabaseError, ProgrammingError
+
+from .cases import BaseTestCase
+from .timing import QueryTimer
+
+
+class ExistenceProbe:
+    """
+    Checks which applicants exist with one query per `max_keys` applicants,
+    so cases for applicants that haven't loaded yet are marked as not found
+    without running their own queries.
+    """
+
+    def __init__(self, db, max_keys: int = 500):
+        self.db = db
+        self.max_keys = max_keys
+        self.queries = 0
+        self.missing = 0
+        self.answered = 0
+
+    def existing(self, destination, keys: list, timer: QueryTimer) -> set:
+        found = set()
+        for start in range(0, len(keys), self.max_keys):
+            chunk = keys[start : start + self.max_keys]
+            sql = destination.build_exists_sql(len(chunk))
+            params = {f"key_{i}": key for i, key in enumerate(chunk)}
+            timer.lap("build")
+            result = self.db.execute(text(sql), params)
+            self.queries += 1
+            timer.lap("execute")
+            found.update(str(row[0]) for row in result)
+            timer.lap("fetch")
+        return found
+
+    def resolve(self, test_cases: List[BaseTestCase]) -> tuple:
+        """
+        Stores not found on the cases of missing applicants. Returns those
+        cases and the cases that still need to be executed.
+        """
+        if not test_cases:
+            return [], test_cases
+        keys = list(OrderedDict.fromkeys(str(c.external_id) for c in test_cases))
+        timer = QueryTimer()
+        try:
+            found = self.existing(type(test_cases[0]), keys, timer)
+        except (DatabaseError, ProgrammingError):
+            return [], test_cases
+        answered, pending = [], []
+        for test_case in test_cases:
+            if str(test_case.external_id) in found:
+                pending.append(test_case)
+            else:
+                answered.append(test_case)
+        for test_case in answered:
+            test_case.store_row_value(None)
+            test_case.record_timings(timer, len(answered))
+        self.missing += len(set(keys) - found)
+        self.answered += len(answered)
+        return answered, pending
+
+    def report(self) -> str:
+        return (
+            f"{self.missing} applicants not found, "
+            f"{self.answered} cases answered without querying"
+        )
@@ -5,6 +5,12 @@ from .cases import BaseTestCase
 
 
 class PSTestCase(BaseTestCase):
+    key_column = "a.adm_appl_nbr"
+    key_param = "adm_appl_nbr"
+    # effective dated destinations that can be answered from a snapshot
+    snapshot = False
+    snapshot_columns = []
+
     def __init__(
         self,
         idx: str,
@@ -15,7 +21,7 @@ class PSTestCase(BaseTestCase):
         filters: str = None,
         **kwargs,
     ):
-        super().__init__(idx, adm_appl_nbr, field, export, expected, filters)
+        super().__init__(idx, adm_appl_nbr, field, export, expected, filters, **kwargs)
         self.adm_appl_nbr = adm_appl_nbr
         self.kwargs = kwargs
 
@@ -23,21 +29,93 @@ class PSTestCase(BaseTestCase):
     def sql_export(self) -> str:
         return f"{self.base}.{self.field}"
 
-    @property
-    def sql(self) -> str:
+    def select_column(self, alias: str) -> str:
+        return f"{self.sql_export} as {alias}"
+
+    def build_sql(self, columns: str) -> str:
         sql = f"""\
             select
-              {self.sql_export} as actual
+              {columns}
             from ps_adm_appl_data a
             {self.join_clause}
             where
-              a.adm_appl_nbr = '{self.adm_appl_nbr}'"""
+              {self.key_column} = :{self.key_param}"""
         if self.filters:
-            sql += f" and {self.filters}"
+            sql += f" and {self.sql_filters}"
         return dedent(sql)
 
+    @classmethod
+    def build_exists_sql(cls, key_count: int) -> str:
+        keys = ", ".join(f":key_{i}" for i in range(key_count))
+        return dedent(
+            f"""\
+            select distinct {cls.key_column}
+            from ps_adm_appl_data a
+            where {cls.key_column} in ({keys})"""
+        )
+
+    @classmethod
+    def build_marker_sql(cls, key_count: int) -> str:
+        keys = ", ".join(f":key_{i}" for i in range(key_count))
+        return dedent(
+            f"""\
+            select a.adm_appl_nbr, max(a.last_updt_dttm)
+            from ps_adm_appl_data a
+            where a.adm_appl_nbr in ({keys})
+            group by a.adm_appl_nbr"""
+        )
+
+    @staticmethod
+    def keys_sql(key_count: int) -> str:
+        return " union all ".join(
+            f"select :key_{i} as appl_key from dual" for i in range(key_count)
+        )
+
+    def build_set_sql(self, columns: str, key_count: int) -> str:
+        # an in list lets oracle probe the application index once per key
+        keys = ", ".join(f":key_{i}" for i in range(key_count))
+        sql = f"""\
+            select *
+            from (
+              select
+                {self.key_column} as appl_key,
+                {columns},
+                row_number() over (partition by {self.key_column} order by null) as rn
+              from ps_adm_appl_data a
+              {self.join_clause}
+              where {self.key_column} in ({keys})"""
+        if self.filters:
+            sql += f" and {self.sql_filters}"
+        return dedent(sql) + "\n) x\nwhere x.rn = 1"
+
+    @classmethod
+    def build_snapshot_sql(cls, key_count: int) -> str:
+        """
+        Selects every column of the destination's current effective rows for
+        `key_count` applications.
+        """
+        columns = ", ".join([f"{cls.base}.*"] + cls.snapshot_columns)
+        sql = f"""\
+            select
+              k.appl_key as snapshot_key,
+              {columns}
+            from ps_adm_appl_data a
+            join ({cls.keys_sql(key_count)}) k on {cls.key_column} = k.appl_key
+            {cls.join_clause}"""
+        return dedent(sql)
+
+    @property
+    def snapshot_column(self) -> str:
+        """The snapshot column that answers this case, if there is one."""
+        if not self.snapshot or self.filters:
+            return None
+        export = self.sql_export
+        if export == f"{self.base}.{self.field}" or export in self.snapshot_columns:
+            return export.split(".", 1)[1].lower()
+        return None
+
     def store_result(self, actual) -> None:
-        # oracle db stores floats as Decimal, so cast it as a float
+        # numbers only arrive as Decimal if the engine coerces them to decimal
         if isinstance(actual, Decimal):
             actual = float(actual)
         super().store_result(actual)
@@ -51,6 +129,8 @@ class AdmApplData(PSTestCase):
 class AdmApplProg(PSTestCase):
     record = "ps_adm_appl_prog"
     base = "prg"
+    snapshot = True
+    snapshot_columns = ["pln.acad_plan", "sbp.acad_sub_plan"]
     join_clause = dedent(
         """\
         join ps_adm_appl_prog prg on 
@@ -108,6 +188,7 @@ class AdmApplProg(PSTestCase):
 class PrimaryName(PSTestCase):
     record = "ps_names"
     base = "n"
+    snapshot = True
     join_clause = dedent(
         """\
         join ps_names n on 
@@ -121,6 +202,7 @@ class PrimaryName(PSTestCase):
 class OtherName(PSTestCase):
     record = "ps_names"
     base = "n"
+    snapshot = True
     join_clause = dedent(
         """\
         join ps_names n on 
@@ -134,6 +216,7 @@ class OtherName(PSTestCase):
 class CurrentAddress(PSTestCase):
     record = "ps_person_address"
     base = "ad"
+    snapshot = True
     join_clause = dedent(
         """\
         join ps_addresses ad on
@@ -143,9 +226,13 @@ class CurrentAddress(PSTestCase):
         """
     )
 
+    @property
+    def lookup_tables(self) -> list:
+        return ["ps_country_tbl"] if self.field == "country" else []
+
     @property
     def sql_export(self) -> str:
-        if self.field == "country":
+        if self.field == "country" and not self.decodes_lookups:
             return "(select descr from ps_country_tbl where country = ad.country)"
         return super().sql_export
 
@@ -153,6 +240,7 @@ class CurrentAddress(PSTestCase):
 class PermanentAddress(PSTestCase):
     record = "ps_addresses"
     base = "ad"
+    snapshot = True
     join_clause = dedent(
         """\
         join ps_addresses ad on
@@ -162,9 +250,13 @@ class PermanentAddress(PSTestCase):
         """
     )
 
+    @property
+    def lookup_tables(self) -> list:
+        return ["ps_country_tbl"] if self.field == "country" else []
+
     @property
     def sql_export(self) -> str:
-        if self.field == "country":
+        if self.field == "country" and not self.decodes_lookups:
             return "(select descr from ps_country_tbl where country = ad.country)"
         return super().sql_export
 
@@ -174,9 +266,13 @@ class Person(PSTestCase):
     base = "p"
     join_clause = "join ps_person p on a.emplid = p.emplid"
 
+    @property
+    def lookup_tables(self) -> list:
+        return ["ps_country_tbl"] if self.field == "birthcountry" else []
+
     @property
     def sql_export(self) -> str:
-        if self.field == "birthcountry":
+        if self.field == "birthcountry" and not self.decodes_lookups:
             return "(select descr from ps_country_tbl where country = p.birthcountry)"
         return super().sql_export
 
@@ -184,6 +280,7 @@ class Person(PSTestCase):
 class PersonDataEffdt(PSTestCase):
     record = "ps_pers_data_effdt"
     base = "pde"
+    snapshot = True
     join_clause = dedent(
         """\
         join ps_pers_data_effdt pde on 
@@ -422,6 +519,7 @@ class Languages(PSTestCase):
 class Checklist(PSTestCase):
     record = "ps_person_checklist"
     base = "c"
+    snapshot = True
     join_clause = dedent(
         """\
         join ps_var_data_admp v on
@@ -490,37 +588,39 @@ class TestScore(PSTestCase):
     )
 
 
+destinations = {
+    "additional data": AdditionalData,
+    "application data": AdmApplData,
+    "checklist": Checklist,
+    "checklist item": ChecklistItem,
+    "academic interests": AcademicInterests,
+    "citizenship": Citizenship,
+    # todo: comm code
+    "current address": CurrentAddress,
+    "general materials": GeneralMaterials,
+    "ethnicity": Ethnicity,
+    "evaluation code": EvaluationCode,
+    "extracurricular activity": ExtraCurricularActivity,
+    "honors & awards": HonorsAndAwards,
+    "languages": Languages,
+    "residency": Residency,
+    "relationship": Relationship,
+    "other name": OtherName,
+    "permanent address": PermanentAddress,
+    "personal data": Person,
+    "personal data effdt": PersonDataEffdt,
+    "phone": Phone,
+    "primary name": PrimaryName,
+    "program data": AdmApplProg,
+    "rating component": RatingComponent,
+    "recruitment category": RecruitmentCategory,
+    "school": School,
+    "ssn": NationalID,
+    "test component": TestScore,
+    "visa": Visa,
+}
+
+
 def build_case(destination: str, **kwargs) -> PSTestCase:
-    destinations = {
-        "additional data": AdditionalData,
-        "application data": AdmApplData,
-        "checklist": Checklist,
-        "checklist item": ChecklistItem,
-        "academic interests": AcademicInterests,
-        "citizenship": Citizenship,
-        # todo: comm code
-        "current address": CurrentAddress,
-        "general materials": GeneralMaterials,
-        "ethnicity": Ethnicity,
-        "evaluation code": EvaluationCode,
-        "extracurricular activity": ExtraCurricularActivity,
-        "honors & awards": HonorsAndAwards,
-        "languages": Languages,
-        "residency": Residency,
-        "relationship": Relationship,
-        "other name": OtherName,
-        "permanent address": PermanentAddress,
-        "personal data": Person,
-        "personal data effdt": PersonDataEffdt,
-        "phone": Phone,
-        "primary name": PrimaryName,
-        "program data": AdmApplProg,
-        "rating component": RatingComponent,
-        "recruitment category": RecruitmentCategory,
-        "school": School,
-        "ssn": NationalID,
-        "test component": TestScore,
-        "visa": Visa,
-    }
     destination_class = destinations.get(destination.lower())
     return destination_class(export="", **kwargs)
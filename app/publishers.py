@@ -1,67 +1,290 @@
+import csv
+import os
+from contextlib import closing
 import re
+import sqlite3
+import threading
+import time
+import weakref
 from typing import List
 
 import gspread
+from gspread.urls import DRIVE_FILES_API_V3_URL
 
 from .cases import BaseTestCase
-from .utils import col_to_a1
+from .utils import cell_text, cells_to_ranges
+
+# one lock per sheets client, so plans sharing a client take turns on its
+# session and quota
+_client_locks = weakref.WeakKeyDictionary()
+_client_locks_guard = threading.Lock()
+
+
+def client_lock(client) -> threading.RLock:
+    with _client_locks_guard:
+        if client not in _client_locks:
+            _client_locks[client] = threading.RLock()
+        return _client_locks[client]
 
 
 def alias_converter(key):
     return re.sub(r"\s+", "_", key.lower())
 
 
-class GoogleSheetsPublisher:
+def publisher_path(config) -> str:
+    """The file an offline publisher reads and writes."""
+    if not config.PUBLISHER_PATH:
+        raise ValueError(
+            f"The {config.PUBLISHER} publisher needs PUBLISHER_PATH or --publisher-path"
+        )
+    return config.PUBLISHER_PATH
+
+
+def worksheet_name(config) -> str:
+    if config.TEST_MODE == "peoplesoft":
+        config.GSPREAD_WORKSHEET_NAME = "PS Test Cases"
+    else:
+        config.GSPREAD_WORKSHEET_NAME = "Test Cases"
+    return config.GSPREAD_WORKSHEET_NAME
+
+
+class BasePublisher:
+    """
+    Reads test cases from a table of rows and publishes results back to it.
+
+    Row numbers follow spreadsheet conventions: the header is row 1 and the
+    first case is row 2. Subclasses provide `read_values` and `write_cells`,
+    and may provide `revision` to let unchanged tables skip a full read.
+    """
+
+    def __init__(self, col_indexes=None, chunk_size=5000):
+        self.col_indexes = col_indexes or {"status": 2, "actual": 9, "comment": 10}
+        self.chunk_size = chunk_size
+        self._revision = None
+        self._header = None
+        self._aliases = None
+        self._rows = {}
+        self.records = None
+        self.changed_rows = set()
+        self.last_publish = {"cells": 0, "skipped": 0, "requests": 0}
+
+    @classmethod
+    def from_config(cls, config):
+        raise NotImplementedError
+
+    def read_values(self) -> List[list]:
+        """Returns every row, header first, as lists of strings."""
+        raise NotImplementedError
+
+    def write_cells(self, cells: list) -> int:
+        """Writes (row, col, value) cells, returning the number of requests."""
+        raise NotImplementedError
+
+    def revision(self):
+        """Returns a marker that changes whenever the table does, if known."""
+        return None
+
+    def share_client(self, clients: dict) -> None:
+        """Reuses an API client shared between publishers, if the backend has one."""
+
+    def publish(self, test_results: List[BaseTestCase]):
+        """
+        Publish test results.
+
+        Only cells whose value differs from the last read of the table are
+        written. Case durations are written too when a "duration" column is
+        configured.
+        """
+        status_col = self.col_indexes["status"]
+        actual_col = self.col_indexes["actual"]
+        duration_col = self.col_indexes.get("duration")
+        cells = []
+        for result in test_results:
+            idx = int(result.idx)
+            cells.append((idx, status_col, result.status))
+            cells.append((idx, actual_col, result.actual))
+            if duration_col and result.duration is not None:
+                cells.append((idx, duration_col, round(result.duration, 3)))
+        changed = [c for c in cells if self.cell_changed(*c)]
+        requests = self.write_cells(changed) if changed else 0
+        self._update_snapshot(changed)
+        self.last_publish = {
+            "cells": len(changed),
+            "skipped": len(cells) - len(changed),
+            "requests": requests,
+        }
+        print(
+            f"Published {len(changed)} cells ({len(cells) - len(changed)} unchanged) "
+            f"in {requests} requests"
+        )
+
+    def cell_changed(self, row: int, col: int, value) -> bool:
+        cached = self._rows.get(row)
+        if cached is None:
+            return True
+        return self._row_value(cached[2], col) != cell_text(value)
+
+    def _update_snapshot(self, cells: list):
+        """Applies written (row, col, value) cells to the last read of the table."""
+        updated = {}
+        for row, col, value in cells:
+            if row not in updated:
+                cached = self._rows.get(row)
+                if cached is None:
+                    continue
+                updated[row] = list(cached[2])
+            values = updated[row]
+            values.extend([""] * (col - len(values)))
+            values[col - 1] = cell_text(value)
+        for row, values in updated.items():
+            record = dict(zip(self._aliases, values))
+            self._rows[row] = (hash(tuple(values)), record, values)
+        if updated:
+            self.records = [record for _, record, _ in self._rows.values()]
+
+    @staticmethod
+    def _row_value(row: list, col: int) -> str:
+        return row[col - 1] if col <= len(row) else ""
+
+    def get_cases(self, statuses=["Untested", "Fail"], filter_func=None):
+        records = self.get_records()
+        filtered = filter(lambda z: z["status"] in statuses, records)
+        if filter_func:
+            filtered = filter(filter_func, filtered)
+        return list(filtered)
+
+    def get_records(self) -> List[dict]:
+        """
+        Returns every row as a dictionary keyed by the aliased column header.
+
+        The read is skipped entirely when the revision has not changed since
+        the last read, and only rows whose contents changed are parsed again.
+        Row numbers of changed rows are kept in `changed_rows`.
+        """
+        revision = self.revision()
+        if (
+            revision is not None
+            and revision == self._revision
+            and self.records is not None
+        ):
+            self.changed_rows = set()
+            return self.records
+        values = self.read_values()
+        if not values:
+            self.records, self.changed_rows = [], set()
+            return self.records
+        header, rows = values[0], values[1:]
+        if header != self._header:
+            self._header = header
+            self._aliases = [alias_converter(k) for k in header]
+            self._rows = {}
+        parsed = {}
+        changed = set()
+        for i, row in enumerate(rows):
+            idx = i + 2
+            key = hash(tuple(row))
+            cached = self._rows.get(idx)
+            if cached is not None and cached[0] == key:
+                parsed[idx] = cached
+            else:
+                parsed[idx] = (key, dict(zip(self._aliases, row)), row)
+                changed.add(idx)
+        self._rows = parsed
+        self._revision = revision
+        self.records = [record for _, record, _ in parsed.values()]
+        self.changed_rows = changed
+        return self.records
+
+    def reset_tests(self):
+        status_col = self.col_indexes.get("status")
+        actual_col = self.col_indexes.get("actual")
+        self.get_records()
+        cells = []
+        for idx, (_, _, row) in self._rows.items():
+            if self._row_value(row, status_col) not in ("", "Untested"):
+                cells.append((idx, status_col, "Untested"))
+            if self._row_value(row, actual_col):
+                cells.append((idx, actual_col, ""))
+        if cells:
+            self.write_cells(cells)
+        self._update_snapshot(cells)
+
+
+class GoogleSheetsPublisher(BasePublisher):
     def __init__(
-        self, credential_path, sheet_key, worksheet_name=None, col_indexes=None
+        self,
+        credential_path,
+        sheet_key,
+        worksheet_name=None,
+        col_indexes=None,
+        chunk_size=5000,
+        max_retries=5,
+        backoff=2.0,
     ):
+        super().__init__(col_indexes, chunk_size)
         self.credential_path = credential_path
         self.sheet_key = sheet_key
         self.worksheet_name = worksheet_name
         self._client = None
         self._wks = None
-        self.col_indexes = col_indexes or {"status": 2, "actual": 9, "comment": 10}
+        self.max_retries = max_retries
+        self.backoff = backoff
 
     @classmethod
     def from_config(cls, config):
-        if config.TEST_MODE == "peoplesoft":
-            config.GSPREAD_WORKSHEET_NAME = "PS Test Cases"
-        else:
-            config.GSPREAD_WORKSHEET_NAME = "Test Cases"
         return cls(
             credential_path=config.GSPREAD_CREDENTIAL,
             sheet_key=config.GSPREAD_SHEET_KEY,
-            worksheet_name=config.GSPREAD_WORKSHEET_NAME,
+            worksheet_name=worksheet_name(config),
             col_indexes=config.COL_INDEXES,
+            chunk_size=config.PUBLISH_CHUNK_SIZE,
+            max_retries=config.PUBLISH_MAX_RETRIES,
         )
 
-    def publish(self, test_results: List[BaseTestCase]):
-        """Publish test results"""
-        status_col = self.col_indexes["status"]
-        actual_col = self.col_indexes["actual"]
-        cells = []
-        for result in test_results:
-            idx = int(result.idx)
-            status_cell = gspread.models.Cell(idx, status_col, result.status)
-            actual_cell = gspread.models.Cell(idx, actual_col, result.actual)
-            cells.append(status_cell)
-            cells.append(actual_cell)
-        if cells:
-            self.worksheet.update_cells(cells, value_input_option="RAW")
+    def read_values(self) -> List[list]:
+        with self.lock:
+            return self.worksheet.get_all_values()
 
-    def get_cases(self, statuses=["Untested", "Fail"], filter_func=None):
-        records = self.worksheet.get_all_records(numericise_ignore=["all"])
-        aliased = []
-        for record in records:
-            x = {}
-            for k, v in record.items():
-                alias = alias_converter(k)
-                x[alias] = v
-            aliased.append(x)
-        filtered = filter(lambda z: z["status"] in statuses, aliased)
-        if filter_func:
-            filtered = filter(filter_func, filtered)
-        return list(filtered)
+    def write_cells(self, cells: list) -> int:
+        """
+        Writes (row, col, value) cells as contiguous ranges, split into
+        requests of at most `chunk_size` cells. Returns the number of requests
+        sent.
+        """
+        cells = sorted(cells, key=lambda c: (c[1], c[0]))
+        requests = 0
+        for i in range(0, len(cells), self.chunk_size):
+            self._batch_update(cells_to_ranges(cells[i : i + self.chunk_size]))
+            requests += 1
+        return requests
+
+    def _batch_update(self, data: list):
+        """Sends a batch update, backing off exponentially when rate limited."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self.lock:
+                    return self.worksheet.batch_update(data, value_input_option="RAW")
+            except gspread.exceptions.APIError as e:
+                status = getattr(e.response, "status_code", None)
+                if status != 429 or attempt == self.max_retries:
+                    raise
+                time.sleep(self.backoff * 2 ** attempt)
+
+    def revision(self):
+        """
+        Returns the spreadsheet's current Drive version, or None if it cannot
+        be determined.
+        """
+        try:
+            with self.lock:
+                response = self.client.request(
+                    "get",
+                    f"{DRIVE_FILES_API_V3_URL}/{self.sheet_key}",
+                    params={"fields": "version"},
+                )
+        except gspread.exceptions.APIError:
+            return None
+        return response.json().get("version")
 
     @property
     def client(self):
@@ -69,25 +292,103 @@ class GoogleSheetsPublisher:
             self._client = gspread.service_account(filename=self.credential_path)
         return self._client
 
+    @property
+    def lock(self) -> threading.RLock:
+        return client_lock(self.client)
+
+    def share_client(self, clients: dict) -> None:
+        """Uses one client per credential across every sheet."""
+        if self.credential_path not in clients:
+            clients[self.credential_path] = self.client
+        self._client = clients[self.credential_path]
+
     @property
     def worksheet(self):
         if self._wks is None:
-            spreadsheet = self.client.open_by_key(self.sheet_key)
-            if self.worksheet_name:
-                self._wks = spreadsheet.worksheet(self.worksheet_name)
-            else:
-                self._wks = spreadsheet.get_worksheet(0)
+            with self.lock:
+                spreadsheet = self.client.open_by_key(self.sheet_key)
+                if self.worksheet_name:
+                    self._wks = spreadsheet.worksheet(self.worksheet_name)
+                else:
+                    self._wks = spreadsheet.get_worksheet(0)
         return self._wks
 
-    def reset_tests(self):
-        wks = self.worksheet
-        status_col = self.col_indexes.get("status")
-        actual_col = self.col_indexes.get("actual")
-        cell_list = []
-        for i, row in enumerate(wks.get_all_records()):
-            idx = i + 2
-            if row["Status"]:
-                cell_list.append(gspread.models.Cell(idx, status_col, "Untested"))
-            if row["Actual"]:
-                cell_list.append(gspread.models.Cell(idx, actual_col, ""))
-        wks.update_cells(cell_list, value_input_option="RAW")
+
+class CSVPublisher(BasePublisher):
+    """Reads and publishes test cases in a local csv file laid out like the sheet."""
+
+    def __init__(self, path, col_indexes=None):
+        super().__init__(col_indexes)
+        self.path = path
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(path=publisher_path(config), col_indexes=config.COL_INDEXES)
+
+    def revision(self):
+        stat = os.stat(self.path)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def read_values(self) -> List[list]:
+        with open(self.path, newline="") as f:
+            return list(csv.reader(f))
+
+    def write_cells(self, cells: list) -> int:
+        values = self.read_values()
+        for row, col, value in cells:
+            line = values[row - 1]
+            line.extend([""] * (col - len(line)))
+            line[col - 1] = cell_text(value)
+        with open(self.path, "w", newline="") as f:
+            csv.writer(f).writerows(values)
+        return 1
+
+
+class SQLitePublisher(BasePublisher):
+    """
+    Reads and publishes test cases in a local SQLite table whose columns are
+    laid out like the sheet. Rows are numbered in rowid order.
+    """
+
+    def __init__(self, path, table, col_indexes=None):
+        super().__init__(col_indexes)
+        self.path = path
+        self.table = table
+        self._columns = []
+        self._rowids = {}
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            path=publisher_path(config),
+            table=alias_converter(worksheet_name(config)),
+            col_indexes=config.COL_INDEXES,
+        )
+
+    def read_values(self) -> List[list]:
+        # closing releases the handle; the connection's own context only commits
+        with closing(sqlite3.connect(self.path)) as conn:
+            cursor = conn.execute(f'select rowid, * from "{self.table}" order by rowid')
+            rows = cursor.fetchall()
+        self._columns = [d[0] for d in cursor.description[1:]]
+        self._rowids = {i + 2: row[0] for i, row in enumerate(rows)}
+        return [self._columns] + [[cell_text(v) for v in row[1:]] for row in rows]
+
+    def write_cells(self, cells: list) -> int:
+        if not self._rowids:
+            self.read_values()
+        with closing(sqlite3.connect(self.path)) as conn, conn:
+            for row, col, value in cells:
+                conn.execute(
+                    f'update "{self.table}" set "{self._columns[col - 1]}" = ? '
+                    "where rowid = ?",
+                    (cell_text(value), self._rowids[row]),
+                )
+        return 1
+
+
+publisher_classes = {
+    "gsheets": GoogleSheetsPublisher,
+    "csv": CSVPublisher,
+    "sqlite": SQLitePublisher,
+}
@@ -0,0 +1,59 @@
+class AdaptiveScheduler:
+    """
+    Chooses how long `--loop` sleeps between runs.
+
+    The interval is measured from the start of one run to the start of the
+    next. It backs off exponentially while the sheet has nothing to test,
+    drops to `min_interval` as soon as new Untested rows appear or a run runs
+    out of time, and otherwise returns to `interval`. Runs never overlap: a
+    run that overruns its interval is still followed by `min_interval` of
+    rest.
+    """
+
+    def __init__(
+        self,
+        interval: float,
+        min_interval: float = 15,
+        max_interval: float = 900,
+        backoff: float = 2.0,
+    ):
+        self.base_interval = interval
+        self.min_interval = min(min_interval, interval)
+        self.max_interval = max(max_interval, interval)
+        self.backoff = backoff
+        self.interval = interval
+        self.reason = "default interval"
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            interval=config.SLEEP_INTERVAL,
+            min_interval=config.MIN_SLEEP_INTERVAL,
+            max_interval=config.MAX_SLEEP_INTERVAL,
+            backoff=config.SLEEP_BACKOFF,
+        )
+
+    def next_delay(
+        self, cases: int, untested: int, seconds: float, deferred: int = 0
+    ) -> float:
+        """
+        Returns the seconds to sleep after a run that tested `cases` cases,
+        `untested` of them new, in `seconds` and ran out of time for
+        `deferred` more.
+        """
+        if deferred:
+            self.interval = self.min_interval
+            self.reason = f"{deferred} deferred cases"
+        elif untested:
+            self.interval = self.min_interval
+            self.reason = f"{untested} new cases"
+        elif not cases:
+            self.interval = min(self.interval * self.backoff, self.max_interval)
+            self.reason = "idle, backing off"
+        else:
+            self.interval = self.base_interval
+            self.reason = f"retested {cases} cases"
+        return max(self.interval - seconds, self.min_interval)
+
+    def report(self, delay: float) -> str:
+        return f"Sleeping {delay:.0f}s (interval {self.interval:.0f}s, {self.reason})..."
@@ -0,0 +1,91 @@
+import zlib
+from collections import Counter
+from typing import List
+
+
+def case_key(record: dict) -> str:
+    """The applicant a raw case belongs to, in either test mode."""
+    return str(record.get("external_id", record.get("adm_appl_nbr")))
+
+
+class Shard:
+    """
+    A deterministic slice of a test plan.
+
+    Cases are assigned by a hash of their applicant, so every case for an
+    applicant lands in the same shard and batching locality is preserved.
+    A shard can be split again, e.g. into processes on one host.
+    """
+
+    def __init__(self, index: int, count: int, parent: "Shard" = None):
+        if not 0 <= index < count:
+            raise ValueError(f"Shard {index + 1} is not between 1 and {count}")
+        self.index = index
+        self.count = count
+        self.parent = parent
+
+    @classmethod
+    def parse(cls, value: str) -> "Shard":
+        """Parses a 1-based shard such as `2/4`."""
+        try:
+            index, count = (int(part) for part in value.split("/"))
+        except ValueError:
+            raise ValueError(f"Expected a shard like 1/4, got {value!r}")
+        return cls(index - 1, count)
+
+    @property
+    def stride(self) -> int:
+        if self.parent is None:
+            return 1
+        return self.parent.stride * self.parent.count
+
+    def split(self, count: int) -> List["Shard"]:
+        return [Shard(i, count, parent=self) for i in range(count)]
+
+    def contains(self, record: dict) -> bool:
+        if self.parent is not None and not self.parent.contains(record):
+            return False
+        value = zlib.crc32(case_key(record).encode())
+        return (value // self.stride) % self.count == self.index
+
+    def __str__(self) -> str:
+        shard = f"{self.index + 1}/{self.count}"
+        return shard if self.parent is None else f"{self.parent}.{shard}"
+
+
+def aggregate(summaries: List[dict]) -> dict:
+    """Combines the run summaries of several shards."""
+    statuses = Counter()
+    destinations = {}
+    for summary in summaries:
+        statuses.update(summary["statuses"])
+        for name, (count, total, longest) in summary["destinations"].items():
+            previous = destinations.get(name, (0, 0.0, 0.0))
+            destinations[name] = (
+                previous[0] + count,
+                previous[1] + total,
+                max(previous[2], longest),
+            )
+    return {
+        "shards": len(summaries),
+        "cases": sum(s["cases"] for s in summaries),
+        "untested": sum(s["untested"] for s in summaries),
+        "skipped": sum(s["skipped"] for s in summaries),
+        "deduplicated": sum(s["deduplicated"] for s in summaries),
+        "deferred": sum(s["deferred"] for s in summaries),
+        "statuses": dict(statuses),
+        "seconds": max((s["seconds"] for s in summaries), default=0.0),
+        "destinations": destinations,
+    }
+
+
+def format_summary(summary: dict) -> str:
+    statuses = ", ".join(f"{k} {v}" for k, v in sorted(summary["statuses"].items()))
+    lines = [
+        f"{summary['shards']} shards ran {summary['cases']} cases "
+        f"in {summary['seconds']:.1f}s ({statuses or 'nothing to test'})"
+    ]
+    ranked = sorted(summary["destinations"].items(), key=lambda kv: -kv[1][1])
+    for name, (count, total, longest) in ranked:
+        lines.append(f"  {name:<28}{count:>7}{total:>10.3f}{longest:>10.3f}")
+    return "\n".join(lines)
@@ -0,0 +1,91 @@
+from collections import OrderedDict
+from typing import List
+
+from sqlalchemy import text
+from sqlalchemy.exc import DatabaseError, ProgrammingError
+
+from .ps_cases import PSTestCase
+from .timing import QueryTimer
+
+
+class SnapshotStage:
+    """
+    Answers PeopleSoft cases on effective dated records from an in-memory
+    snapshot of the current effective rows.
+
+    Each destination's rows are loaded once per run with a single query per
+    `max_keys` applications, so the correlated `max(effdt)` subqueries are
+    evaluated once per applicant rather than once per case.
+    """
+
+    def __init__(self, db, max_keys: int = 500):
+        self.db = db
+        self.max_keys = max_keys
+        self.queries = 0
+        self.answered = 0
+
+    def load(self, destination, keys: list, timer: QueryTimer) -> tuple:
+        """
+        Returns the first current row for each key, by lowercase column, and
+        the snapshot's columns.
+        """
+        rows = {}
+        columns = set()
+        for start in range(0, len(keys), self.max_keys):
+            chunk = keys[start : start + self.max_keys]
+            sql = destination.build_snapshot_sql(len(chunk))
+            params = {f"key_{i}": key for i, key in enumerate(chunk)}
+            timer.lap("build")
+            result = self.db.execute(text(sql), params)
+            self.queries += 1
+            timer.lap("execute")
+            columns.update(k.lower() for k in result.keys())
+            for row in result:
+                row = {k.lower(): v for k, v in row.items()}
+                rows.setdefault(str(row["snapshot_key"]), row)
+            timer.lap("fetch")
+        return rows, columns
+
+    def resolve(self, test_cases: List[PSTestCase]) -> tuple:
+        """
+        Stores results on the cases a snapshot can answer. Returns the
+        answered cases and the cases that still need to be executed.
+        """
+        by_destination = OrderedDict()
+        pending = []
+        for test_case in test_cases:
+            if getattr(test_case, "snapshot_column", None):
+                by_destination.setdefault(type(test_case), []).append(test_case)
+            else:
+                pending.append(test_case)
+
+        answered = []
+        for destination, cases in by_destination.items():
+            keys = list(OrderedDict.fromkeys(str(c.external_id) for c in cases))
+            timer = QueryTimer()
+            try:
+                rows, columns = self.load(destination, keys, timer)
+            except (DatabaseError, ProgrammingError):
+                # fall back to querying each case
+                pending.extend(cases)
+                continue
+            resolved = []
+            for test_case in cases:
+                row = rows.get(str(test_case.external_id))
+                if test_case.snapshot_column not in columns:
+                    # not a column of the record, let the query report it
+                    pending.append(test_case)
+                    continue
+                if row is None:
+                    test_case.store_row_value(None)
+                else:
+                    test_case.store_row_value(row, test_case.snapshot_column)
+                resolved.append(test_case)
+            for test_case in resolved:
+                test_case.record_timings(timer, len(resolved))
+            answered.extend(resolved)
+        self.answered += len(answered)
+        return answered, pending
+
+    def report(self) -> str:
+        return f"Answered {self.answered} cases from {self.queries} snapshot queries"
@@ -0,0 +1,256 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+from datetime import datetime
+from typing import List
+
+from sqlalchemy import text
+from sqlalchemy.exc import DataError, DBAPIError, ProgrammingError, SQLAlchemyError
+
+from .cases import BaseTestCase
+
+SCHEMA = [
+    """create table if not exists runs (
+        id integer primary key,
+        plan text,
+        started_at text,
+        finished_at text,
+        cases integer,
+        skipped integer,
+        statuses text
+    )""",
+    """create table if not exists results (
+        run_id integer,
+        fingerprint text,
+        idx text,
+        destination text,
+        field text,
+        export text,
+        expected text,
+        filters text,
+        external_id text,
+        sql text,
+        actual text,
+        status text,
+        marker text,
+        recorded_at text
+    )""",
+    "create index if not exists ix_results_fingerprint on results (fingerprint)",
+    """create table if not exists latest (
+        fingerprint text primary key,
+        status text,
+        marker text,
+        run_id integer
+    )""",
+]
+
+# only cases the sheet already shows as failing can be skipped
+SKIPPABLE_STATUSES = ["Fail", "Error"]
+# database errors caused by the case itself rather than the connection, for
+# drivers that don't report an error code
+REPEATABLE_ERRORS = (ProgrammingError, DataError)
+ORACLE_ERROR = re.compile(r"\bORA-(\d{5})\b")
+SQLSTATE = re.compile(r"^[0-9A-Z]{5}$")
+# sqlstate classes for syntax or access rule violations and data exceptions
+REPEATABLE_SQLSTATE_CLASSES = ["42", "22"]
+# sqlite's generic error, raised for unknown columns, tables and bad syntax
+SQLITE_ERROR = 1
+
+
+def fingerprint(test_case: BaseTestCase, plan: str = None) -> str:
+    """Hashes everything the plan, sheet row and code contribute to a result."""
+    inputs = [
+        plan,
+        test_case.__class__.__name__,
+        test_case.field,
+        test_case.export,
+        test_case.expected,
+        test_case.filters,
+        test_case.external_id,
+        test_case.sql,
+    ]
+    return hashlib.sha1(json.dumps(inputs, default=str).encode()).hexdigest()
+
+
+def repeatable(test_case: BaseTestCase) -> bool:
+    """
+    Whether rerunning the case against an unchanged applicant is sure to give
+    the same result. Deadlocks, dropped connections and the like aren't.
+    """
+    exc = test_case._exc
+    if exc is None:
+        return True
+    if isinstance(exc, DBAPIError):
+        return repeatable_database_error(exc)
+    # other sqlalchemy errors are pool and connection trouble
+    return not isinstance(exc, SQLAlchemyError)
+
+
+def repeatable_oracle_error(code: int) -> bool:
+    # ORA-009xx: invalid sql and identifiers, ORA-01722: invalid number,
+    # ORA-018xx: date conversions
+    return code // 100 in (9, 18) or code == 1722
+
+
+def repeatable_database_error(exc: DBAPIError) -> bool:
+    """
+    Classifies a driver error by its code, since drivers raise the same
+    exception class for bad queries and lost connections.
+    """
+    orig = exc.orig
+    match = ORACLE_ERROR.search(str(orig))
+    if match:
+        return repeatable_oracle_error(int(match.group(1)))
+    args = getattr(orig, "args", ())
+    # pyodbc leads with the sqlstate
+    if args and isinstance(args[0], str) and SQLSTATE.match(args[0]):
+        return args[0][:2] in REPEATABLE_SQLSTATE_CLASSES
+    errorcode = getattr(orig, "sqlite_errorcode", None)
+    if errorcode is not None:
+        return errorcode == SQLITE_ERROR
+    return isinstance(exc, REPEATABLE_ERRORS)
+
+
+def fetch_markers(db, test_cases: List[BaseTestCase], max_keys: int = 500) -> None:
+    """Sets `marker` on each case to when its applicant was last updated."""
+    if not test_cases:
+        return
+    destination = type(test_cases[0])
+    keys = list(dict.fromkeys(str(c.external_id) for c in test_cases))
+    markers = {}
+    for start in range(0, len(keys), max_keys):
+        chunk = keys[start : start + max_keys]
+        sql = destination.build_marker_sql(len(chunk))
+        params = {f"key_{i}": key for i, key in enumerate(chunk)}
+        for key, marker in db.execute(text(sql), params):
+            markers[str(key)] = None if marker is None else str(marker)
+    for test_case in test_cases:
+        test_case.marker = markers.get(str(test_case.external_id))
+
+
+class ResultStore:
+    """
+    A local SQLite history of every result, used to skip failing cases whose
+    row and applicant haven't changed since they last ran.
+
+    Several plans and shard processes can share one file. Results are held in
+    memory until `commit`, so the write lock is only taken for a moment.
+    """
+
+    def __init__(self, path: str, plan: str = None):
+        self.path = path
+        self.plan = plan
+        self._lock = threading.Lock()
+        self._results = []
+        self._latest = {}
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        # readers don't wait on a writer
+        self.conn.execute("pragma journal_mode=wal")
+        for statement in SCHEMA:
+            self.conn.execute(statement)
+        self.conn.commit()
+
+    def start_run(self) -> int:
+        with self._lock:
+            cursor = self.conn.execute(
+                "insert into runs (plan, started_at) values (?, ?)",
+                (self.plan, datetime.now().isoformat(timespec="seconds")),
+            )
+            self.conn.commit()
+            return cursor.lastrowid
+
+    def finish_run(self, run_id: int, summary: dict) -> None:
+        with self._lock:
+            self.conn.execute(
+                "update runs set finished_at = ?, cases = ?, skipped = ?, statuses = ? "
+                "where id = ?",
+                (
+                    datetime.now().isoformat(timespec="seconds"),
+                    summary["cases"],
+                    summary["skipped"],
+                    json.dumps(summary["statuses"]),
+                    run_id,
+                ),
+            )
+            self.conn.commit()
+
+    def unchanged(self, test_cases: List[BaseTestCase]) -> List[BaseTestCase]:
+        """
+        Returns the failing cases whose fingerprint and applicant marker match
+        their last recorded run, which would fail the same way again.
+        """
+        with self._lock:
+            latest = {
+                row[0]: row[1:]
+                for row in self.conn.execute(
+                    "select fingerprint, status, marker from latest"
+                )
+            }
+        unchanged = []
+        for test_case in test_cases:
+            if test_case._status not in SKIPPABLE_STATUSES or test_case.marker is None:
+                continue
+            if latest.get(fingerprint(test_case, self.plan)) == (
+                test_case._status,
+                test_case.marker,
+            ):
+                unchanged.append(test_case)
+        return unchanged
+
+    def record(self, run_id: int, test_case: BaseTestCase) -> None:
+        key = fingerprint(test_case, self.plan)
+        row = (
+            run_id,
+            key,
+            str(test_case.idx),
+            test_case.__class__.__name__,
+            test_case.field,
+            test_case.export,
+            test_case.expected,
+            test_case.filters,
+            str(test_case.external_id),
+            test_case.sql,
+            None if test_case.actual is None else str(test_case.actual),
+            test_case.status,
+            test_case.marker,
+            datetime.now().isoformat(timespec="seconds"),
+        )
+        # never skip a case whose last failure may not happen again
+        latest = (test_case.status, test_case.marker) if repeatable(test_case) else None
+        with self._lock:
+            self._results.append(row)
+            self._latest[key] = (latest, run_id)
+
+    def commit(self) -> None:
+        """Writes the results recorded since the last commit."""
+        with self._lock:
+            results, self._results = self._results, []
+            latest, self._latest = self._latest, {}
+            self.conn.executemany(
+                "insert into results values (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                results,
+            )
+            self.conn.executemany(
+                "insert or replace into latest values (?, ?, ?, ?)",
+                [
+                    (key, value[0], value[1], run_id)
+                    for key, (value, run_id) in latest.items()
+                    if value is not None
+                ],
+            )
+            self.conn.executemany(
+                "delete from latest where fingerprint = ?",
+                [(key,) for key, (value, _) in latest.items() if value is None],
+            )
+            self.conn.commit()
+
+    def history(self, limit: int = 10) -> list:
+        """The most recent runs, newest first."""
+        with self._lock:
+            return self.conn.execute(
+                "select id, plan, started_at, finished_at, cases, skipped, statuses "
+                "from runs order by id desc limit ?",
+                (limit,),
+            ).fetchall()
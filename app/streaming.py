@@ -0,0 +1,71 @@
+import queue
+import threading
+import time
+
+from .cases import BaseTestCase
+
+_CLOSE = object()
+
+
+class StreamingPublisher:
+    """
+    Publishes executed test cases from a background thread as they arrive.
+
+    Results are buffered in a bounded queue, so `put` blocks once `queue_size`
+    results are waiting, and are flushed every `flush_size` results or
+    `flush_interval` seconds, whichever comes first.
+    """
+
+    def __init__(self, publisher, flush_size=500, flush_interval=30, queue_size=5000):
+        self.publisher = publisher
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._error = None
+        self.published = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def put(self, test_case: BaseTestCase) -> None:
+        if self._error is not None:
+            raise self._error
+        self._queue.put(test_case)
+
+    def close(self) -> None:
+        """Flushes any pending results and stops the background thread."""
+        self._queue.put(_CLOSE)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def _run(self):
+        pending = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                item = None
+            closing = item is _CLOSE
+            if item is not None and not closing:
+                pending.append(item)
+            if pending and (
+                closing
+                or len(pending) >= self.flush_size
+                or time.monotonic() >= deadline
+            ):
+                self._flush(pending)
+                pending = []
+            if time.monotonic() >= deadline or not pending:
+                deadline = time.monotonic() + self.flush_interval
+            if closing:
+                return
+
+    def _flush(self, test_cases):
+        try:
+            self.publisher.publish(test_cases)
+        except Exception as e:
+            # surfaced to the executor on its next put or on close
+            self._error = e
+        else:
+            self.published += len(test_cases)
@@ -0,0 +1,137 @@
+import heapq
+import itertools
+import math
+import threading
+import time
+
+from sqlalchemy import event
+
+# error text drivers report when a statement is cancelled for running too long
+TIMEOUT_MESSAGES = [
+    "HYT00",  # pyodbc: query timeout expired
+    "DPI-1067",  # cx_Oracle: call timeout exceeded
+    "ORA-01013",  # oracle: user requested cancel of current operation
+    "interrupted",  # sqlite3: interrupted by the watchdog
+]
+
+# seconds the client waits for the server to enforce its own timeout
+SERVER_GRACE = 5
+
+
+def is_timeout(exc: Exception) -> bool:
+    message = str(exc)
+    return any(text in message for text in TIMEOUT_MESSAGES)
+
+
+def cancel(cursor, dbapi_connection) -> None:
+    """Cancels the statement running on a DBAPI connection."""
+    targets = [
+        (cursor, "cancel"),  # pyodbc
+        (dbapi_connection, "cancel"),  # cx_Oracle
+        (dbapi_connection, "interrupt"),  # sqlite3
+    ]
+    for target, name in targets:
+        method = getattr(target, name, None)
+        if method is not None:
+            method()
+            return
+
+
+class Watchdog:
+    """
+    Cancels statements still running at their deadline, from one thread
+    shared by every engine rather than a timer thread per statement.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        # (deadline, token), including finished statements until they're due
+        self._deadlines = []
+        # statements still running, by token
+        self._running = {}
+        self._tokens = itertools.count()
+        self._thread = None
+
+    def watch(self, seconds: float, cursor, dbapi_connection) -> int:
+        with self._condition:
+            token = next(self._tokens)
+            self._running[token] = (cursor, dbapi_connection)
+            heapq.heappush(self._deadlines, (time.monotonic() + seconds, token))
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="query-watchdog", daemon=True
+                )
+                self._thread.start()
+            elif self._deadlines[0][1] == token:
+                self._condition.notify()
+            return token
+
+    def unwatch(self, token: int) -> None:
+        with self._condition:
+            self._running.pop(token, None)
+
+    def _run(self):
+        with self._condition:
+            while True:
+                if not self._deadlines:
+                    self._condition.wait()
+                    continue
+                deadline, token = self._deadlines[0]
+                delay = deadline - time.monotonic()
+                if delay > 0:
+                    self._condition.wait(delay)
+                    continue
+                heapq.heappop(self._deadlines)
+                target = self._running.pop(token, None)
+                if target is None:
+                    continue
+                # cancelling under the lock means a statement that has just
+                # finished can't have the next one on its connection cancelled
+                try:
+                    cancel(*target)
+                except Exception:
+                    # the connection may have been closed meanwhile
+                    pass
+
+
+watchdog = Watchdog()
+
+
+def install_timeouts(engine, seconds: float) -> None:
+    """
+    Limits every statement run on `engine` to `seconds`.
+
+    SQL Server and Oracle enforce the limit through their drivers' query and
+    call timeouts. The shared watchdog cancels any statement still running
+    after that, which is the only limit on other backends.
+    """
+    dialect = engine.dialect.name
+    server_side = dialect in ("mssql", "oracle")
+    watchdog_delay = seconds + SERVER_GRACE if server_side else seconds
+
+    @event.listens_for(engine, "connect")
+    def set_driver_timeout(dbapi_connection, connection_record):
+        if dialect == "mssql":
+            dbapi_connection.timeout = math.ceil(seconds)
+        elif dialect == "oracle":
+            dbapi_connection.call_timeout = int(seconds * 1000)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_watchdog(conn, cursor, statement, parameters, context, executemany):
+        conn.info["watchdog"] = watchdog.watch(
+            watchdog_delay, cursor, conn.connection.connection
+        )
+
+    def stop_watchdog(conn):
+        token = conn.info.pop("watchdog", None)
+        if token is not None:
+            watchdog.unwatch(token)
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_execute(conn, cursor, statement, parameters, context, executemany):
+        stop_watchdog(conn)
+
+    @event.listens_for(engine, "handle_error")
+    def on_error(context):
+        if context.connection is not None:
+            stop_watchdog(context.connection)
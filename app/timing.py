@@ -0,0 +1,105 @@
+import heapq
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+PHASES = ("build", "execute", "fetch")
+
+
+class QueryTimer:
+    """Accumulates wall time for the build, execute and fetch phases of a query."""
+
+    def __init__(self):
+        self.timings = dict.fromkeys(PHASES, 0.0)
+        self._mark = time.perf_counter()
+
+    def lap(self, phase: str) -> None:
+        """Attributes the time since the previous lap to `phase`."""
+        now = time.perf_counter()
+        self.timings[phase] += now - self._mark
+        self._mark = now
+
+
+class TimingReport:
+    """
+    Aggregates case timings per destination and per field for a run, keeping
+    the slowest cases.
+    """
+
+    def __init__(self, threshold: float = None, keep: int = 10):
+        self.threshold = threshold
+        self.keep = keep
+        self.destinations = OrderedDict()
+        self.fields = OrderedDict()
+        self.slow = []
+        self.records = []
+        self._slowest = []
+        self._seq = 0
+
+    @staticmethod
+    def destination(test_case) -> str:
+        return test_case.__class__.__name__
+
+    def add(self, test_case) -> None:
+        duration = test_case.duration
+        if duration is None:
+            return
+        destination = self.destination(test_case)
+        for key, totals in [
+            (destination, self.destinations),
+            ((destination, test_case.field), self.fields),
+        ]:
+            count, total, longest = totals.get(key, (0, 0.0, 0.0))
+            totals[key] = (count + 1, total + duration, max(longest, duration))
+        if self.threshold and duration >= self.threshold:
+            self.slow.append(test_case)
+        self.records.append(self.record(test_case))
+        self._seq += 1
+        entry = (duration, self._seq, test_case)
+        if len(self._slowest) < self.keep:
+            heapq.heappush(self._slowest, entry)
+        else:
+            heapq.heappushpop(self._slowest, entry)
+
+    def slowest(self) -> list:
+        return [entry[2] for entry in sorted(self._slowest, reverse=True)]
+
+    def report(self) -> str:
+        lines = ["Slowest destinations (count, mean s, max s):"]
+        ranked = sorted(
+            self.destinations.items(), key=lambda kv: kv[1][1] / kv[1][0], reverse=True
+        )
+        for destination, (count, total, longest) in ranked[: self.keep]:
+            lines.append(
+                f"  {destination:<28}{count:>7}{total / count:>10.3f}{longest:>10.3f}"
+            )
+        lines.append(f"Slowest {len(self._slowest)} cases:")
+        for test_case in self.slowest():
+            lines.append(
+                f"  row {test_case.idx:<8}{self.destination(test_case):<28}"
+                f"{test_case.field:<24}{test_case.duration:>10.3f}"
+            )
+        if self.threshold:
+            lines.append(f"{len(self.slow)} cases took longer than {self.threshold}s")
+        return "\n".join(lines)
+
+    def record(self, test_case) -> dict:
+        return {
+            "idx": test_case.idx,
+            "destination": self.destination(test_case),
+            "field": test_case.field,
+            "export": test_case.export,
+            "external_id": test_case.external_id,
+            "batch_size": test_case.batch_size,
+            **test_case.timings,
+            "total": test_case.duration,
+            "slow": bool(self.threshold and test_case.duration >= self.threshold),
+            "recorded_at": datetime.now().isoformat(timespec="seconds"),
+        }
+
+    def write_jsonl(self, path: str) -> None:
+        """Appends one line per timed case to `path`."""
+        with open(path, "a") as f:
+            for record in self.records:
+                f.write(json.dumps(record) + "\n")
@@ -28,3 +28,65 @@ def col_to_a1(col: int) -> str:
         col_label = chr(mod + 64) + col_label
 
     return col_label
+
+
+def cells_to_ranges(cells: list) -> list:
+    """
+    Groups cells into contiguous single-column ranges.
+
+    For example:
+    > cells_to_ranges([(2, 2, "Pass"), (3, 2, "Fail"), (5, 2, "Pass")])
+    [{'range': 'B2:B3', 'values': [['Pass'], ['Fail']]},
+     {'range': 'B5:B5', 'values': [['Pass']]}]
+
+    Parameters
+    ----------
+    cells : list
+        A list of (row, col, value) tuples.
+
+    Returns
+    -------
+    list
+        A list of dicts in the form accepted by `Worksheet.batch_update`.
+    """
+    ranges = []
+    start = end = col = None
+    values = []
+    for row, cell_col, value in sorted(cells, key=lambda c: (c[1], c[0])):
+        if cell_col == col and row == end + 1:
+            end = row
+            values.append([value])
+            continue
+        if values:
+            ranges.append(_a1_range(col, start, end, values))
+        start = end = row
+        col = cell_col
+        values = [[value]]
+    if values:
+        ranges.append(_a1_range(col, start, end, values))
+    return ranges
+
+
+def _a1_range(col: int, start: int, end: int, values: list) -> dict:
+    label = col_to_a1(col)
+    return {"range": f"{label}{start}:{label}{end}", "values": values}
+
+
+def cell_text(value) -> str:
+    """
+    Formats a value the way the sheet displays it after a RAW write.
+
+    Parameters
+    ----------
+    value
+        A cell value.
+
+    Returns
+    -------
+    str
+    """
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
@@ -0,0 +1,254 @@
+"""
+Times case building, sql generation, execution and publishing per destination
+against a stand-in Slate database.
+
+Run a benchmark and save the results:
+    python -m benchmarks.bench run --applicants 200 --strategy batch -o before.json
+
+Compare two runs:
+    python -m benchmarks.bench compare before.json after.json
+"""
+import contextlib
+import io
+import json
+import os
+import sqlite3
+import subprocess
+import tempfile
+import time
+from collections import OrderedDict
+
+import click
+from sqlalchemy import event
+
+from app.batching import (
+    execute_batch,
+    execute_set,
+    group_by_applicant,
+    group_by_destination,
+)
+from app.cases import build_case
+from app.publishers import SQLitePublisher
+
+from .schema import build_database, generate_cases
+
+SHEET_HEADER = [
+    "Idx",
+    "Status",
+    "Destination",
+    "External ID",
+    "Field",
+    "Export",
+    "Expected",
+    "Filters",
+    "Actual",
+]
+
+STRATEGIES = {
+    "single": (lambda cases: [[c] for c in cases], execute_batch),
+    "batch": (group_by_applicant, execute_batch),
+    "set": (group_by_destination, execute_set),
+}
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(count: int, elapsed: float, latencies: list = None) -> dict:
+    summary = {
+        "seconds": round(elapsed, 6),
+        "cases_per_sec": round(count / elapsed, 1) if elapsed else None,
+    }
+    if latencies is not None:
+        summary["p50_ms"] = round(percentile(latencies, 50) * 1000, 3)
+        summary["p95_ms"] = round(percentile(latencies, 95) * 1000, 3)
+    return summary
+
+
+def create_sheet(path: str, raw_cases: list) -> SQLitePublisher:
+    """Loads the raw cases into a SQLite table laid out like the worksheet."""
+    with sqlite3.connect(path) as conn:
+        columns = ", ".join(f'"{h}"' for h in SHEET_HEADER)
+        conn.execute("drop table if exists test_cases")
+        conn.execute(f"create table test_cases ({columns})")
+        conn.executemany(
+            f"insert into test_cases values ({', '.join('?' * len(SHEET_HEADER))})",
+            [
+                [c[k] for k in ["idx", "status", "destination", "external_id"]]
+                + [c[k] for k in ["field", "export", "expected", "filters"]]
+                + [""]
+                for c in raw_cases
+            ],
+        )
+    publisher = SQLitePublisher(path, "test_cases")
+    publisher.get_records()
+    return publisher
+
+
+def git_commit() -> str:
+    try:
+        output = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.stdout.strip()
+
+
+def run_benchmark(applicants: int, strategy: str, seed: int, workdir: str) -> dict:
+    engine, external_ids = build_database(
+        os.path.join(workdir, "slate.db"), applicants, seed
+    )
+    raw_cases = generate_cases(external_ids, seed)
+    publisher = create_sheet(os.path.join(workdir, "sheet.db"), raw_cases)
+    planner, executor = STRATEGIES[strategy]
+    statements = []
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def count_statement(conn, cursor, statement, parameters, context, many):
+        statements.append(statement)
+
+    by_destination = OrderedDict()
+    for raw_case in raw_cases:
+        by_destination.setdefault(raw_case["destination"], []).append(raw_case)
+
+    destinations = OrderedDict()
+    totals = {
+        "cases": 0,
+        "errors": 0,
+        "statements": 0,
+        "distinct_statements": set(),
+        "execute_seconds": 0.0,
+        "latencies": [],
+    }
+    for destination, rows in by_destination.items():
+        start = time.perf_counter()
+        test_cases = [build_case(**row) for row in rows]
+        build_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for test_case in test_cases:
+            test_case.sql
+        sql_time = time.perf_counter() - start
+
+        latencies = []
+        statements.clear()
+        start = time.perf_counter()
+        for batch in planner(test_cases):
+            batch_start = time.perf_counter()
+            executor(engine, batch)
+            per_case = (time.perf_counter() - batch_start) / len(batch)
+            latencies.extend([per_case] * len(batch))
+        execute_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            publisher.publish(test_cases)
+        publish_time = time.perf_counter() - start
+
+        errors = sum(1 for c in test_cases if c.status == "Error")
+        destinations[destination] = {
+            "cases": len(test_cases),
+            "errors": errors,
+            "build": summarize(len(test_cases), build_time),
+            "sql": summarize(len(test_cases), sql_time),
+            "execute": summarize(len(test_cases), execute_time, latencies),
+            # distinct statement texts are what the server has to parse
+            "statements": len(statements),
+            "distinct_statements": len(set(statements)),
+            "publish": summarize(len(test_cases), publish_time),
+        }
+        totals["cases"] += len(test_cases)
+        totals["errors"] += errors
+        totals["statements"] += len(statements)
+        totals["distinct_statements"].update(statements)
+        totals["execute_seconds"] += execute_time
+        totals["latencies"].extend(latencies)
+
+    return {
+        "commit": git_commit(),
+        "applicants": applicants,
+        "strategy": strategy,
+        "seed": seed,
+        "total": {
+            "cases": totals["cases"],
+            "errors": totals["errors"],
+            "statements": totals["statements"],
+            "distinct_statements": len(totals["distinct_statements"]),
+            "execute": summarize(
+                totals["cases"], totals["execute_seconds"], totals["latencies"]
+            ),
+        },
+        "destinations": destinations,
+    }
+
+
+@click.group()
+def cli():
+    pass
+
+
+@cli.command()
+@click.option("--applicants", type=int, default=100, show_default=True)
+@click.option("--strategy", type=click.Choice(list(STRATEGIES)), default="batch")
+@click.option("--seed", type=int, default=0)
+@click.option("-o", "--output", type=click.Path(), help="Write results as JSON")
+def run(applicants, strategy, seed, output=None):
+    with tempfile.TemporaryDirectory() as workdir:
+        results = run_benchmark(applicants, strategy, seed, workdir)
+    print(
+        f"{'destination':<24}{'cases':>8}{'cases/s':>12}{'p50 ms':>10}{'p95 ms':>10}"
+        f"{'stmts':>8}{'distinct':>10}"
+    )
+    for destination, result in results["destinations"].items():
+        execute = result["execute"]
+        print(
+            f"{destination:<24}{result['cases']:>8}{execute['cases_per_sec']:>12}"
+            f"{execute['p50_ms']:>10}{execute['p95_ms']:>10}"
+            f"{result['statements']:>8}{result['distinct_statements']:>10}"
+        )
+    total = results["total"]
+    print(
+        f"{'total':<24}{total['cases']:>8}{total['execute']['cases_per_sec']:>12}"
+        f"{total['execute']['p50_ms']:>10}{total['execute']['p95_ms']:>10}"
+        f"{total['statements']:>8}{total['distinct_statements']:>10}"
+    )
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+@cli.command()
+@click.argument("baseline", type=click.File())
+@click.argument("candidate", type=click.File())
+@click.option("--threshold", type=float, default=10.0, help="Regression percentage")
+def compare(baseline, candidate, threshold):
+    before, after = json.load(baseline), json.load(candidate)
+    print(f"{before['commit']} -> {after['commit']}")
+    regressions = 0
+    for destination, result in after["destinations"].items():
+        previous = before["destinations"].get(destination)
+        if previous is None:
+            continue
+        old = previous["execute"]["cases_per_sec"] or 0
+        new = result["execute"]["cases_per_sec"] or 0
+        change = (new - old) / old * 100 if old else 0.0
+        flag = ""
+        if change < -threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"{destination:<24}{old:>12}{new:>12}{change:>+9.1f}%{flag}")
+    if regressions:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,192 @@
+"""
+A synthetic, Slate-like schema in SQLite along with matching test case rows.
+
+The tables hold just enough columns for every destination in
+`app.cases.destinations` to produce a query that SQLite can run once it has
+been passed through `benchmarks.sqlite_shim`.
+"""
+import random
+import re
+
+from sqlalchemy import create_engine
+
+from app.cases import FieldTestCase, destinations
+
+from .sqlite_shim import install_shim
+
+TABLES = {
+    "application": ["id", "external_id", "person", "round", "submitted", "updated"],
+    "person": ["id", "first", "last", "ssn", "birthdate", "email"],
+    "address": ["id", "record", "street", "city", "region", "postal", "country"],
+    "activity": ["id", "record", "name", "type"],
+    "device": ["id", "record", "type", "value"],
+    "entity": ["id", "record", "entity", "name"],
+    "interest": ["id", "record", "name", "type", "rank", "description"],
+    "job": ["id", "record", "title", "organization", "city"],
+    "relation": ["id", "record", "first", "last", "type", "education_level"],
+    "school": ["id", "record", "name", "degree", "type", "ceeb"],
+    "test": ["record", "type", "subtype", "date", "confirmed", "total"]
+    + [f"score{i}" for i in range(1, 18)],
+    "field_value": ["record", "field", "kind", "value"],
+    "lookup.round": ["id", "name", "period"],
+    "lookup.period": ["id", "name"],
+    "lookup.prompt": ["id", "value"],
+    "lookup.test": ["id", "subtype", "name", "subname"],
+}
+
+CUSTOM_FIELDS = ["sport", "hobby", "intended_major"]
+FIELD_KINDS = ["extended", "export", "export2"]
+
+# fields tested for each destination; field destinations use CUSTOM_FIELDS
+DESTINATION_FIELDS = {
+    "activity": ["name", "type"],
+    "address": ["street", "city", "postal", "country"],
+    "application": ["round", "period", "submitted"],
+    "device": ["type", "value"],
+    "job": ["title", "organization"],
+    "interests": ["name", "rank", "sport"],
+    "person": ["first", "last", "ssn", "birthdate"],
+    "school": ["name", "degree", "type"],
+    "relationship": ["first", "type", "education_level"],
+    "relationship address": ["city", "country"],
+    "relationship job": ["title"],
+    "relationship school": ["name", "degree"],
+    "test scores": ["name", "total", "score1"],
+}
+
+
+def entity_ids() -> dict:
+    """Returns the entity id joined by each entity-based destination."""
+    ids = {}
+    for name, destination_class in destinations.items():
+        match = re.search(r"\.\[entity\] = '([^']+)'", destination_class.join_clause)
+        if match:
+            ids[name] = match.group(1)
+    return ids
+
+
+def create_schema(engine) -> None:
+    for table, columns in TABLES.items():
+        engine.execute(f'drop table if exists "{table}"')
+        engine.execute(f'create table "{table}" ({", ".join(columns)})')
+    engine.execute("create index ix_application on application (external_id)")
+    engine.execute("create index ix_field_value on field_value (record, field)")
+    for table in ["address", "activity", "device", "entity", "interest"]:
+        engine.execute(f"create index ix_{table} on {table} (record)")
+    for table in ["job", "relation", "school", "test"]:
+        engine.execute(f"create index ix_{table} on {table} (record)")
+
+
+def populate(engine, applicants: int, seed: int = 0) -> list:
+    """
+    Fills the schema with `applicants` applications and their related
+    records, returning the loaded external ids.
+    """
+    rng = random.Random(seed)
+    rows = {table: [] for table in TABLES}
+    next_id = iter(range(1, 10 ** 9))
+    rows["lookup.period"] = [(1, "Fall 2021"), (2, "Fall 2022")]
+    rows["lookup.round"] = [(1, "Early Action", 1), (2, "Regular Decision", 2)]
+    rows["lookup.prompt"] = [(i, f"Prompt {i}") for i in range(1, 21)]
+    rows["lookup.test"] = [(i, 0, f"Test {i}", None) for i in range(1, 6)]
+    entities = list(entity_ids().values())
+    external_ids = []
+
+    def fields(record):
+        for field in CUSTOM_FIELDS:
+            for kind in FIELD_KINDS:
+                rows["field_value"].append(
+                    (record, field, kind, f"{field}-{kind}-{rng.randint(1, 5)}")
+                )
+
+    for n in range(applicants):
+        external_id = f"app{n:07}"
+        external_ids.append(external_id)
+        person, application = next(next_id), next(next_id)
+        rows["person"].append(
+            (person, f"First{n}", f"Last{n}", f"{n:09}", "2003-01-01", f"{n}@x.org")
+        )
+        rows["application"].append(
+            (application, external_id, person, rng.randint(1, 2), "2021-11-01", None)
+        )
+        fields(person)
+        fields(application)
+        rows["address"].append(
+            (next(next_id), person, f"{n} Main St", "Ann Arbor", "MI", "48109", "US")
+        )
+        rows["activity"].append((next(next_id), application, "Band", "Arts"))
+        rows["device"].append((next(next_id), person, "Mobile", "555-0100"))
+        for entity in entities:
+            entity_row = next(next_id)
+            rows["entity"].append((entity_row, application, entity, "Entity"))
+            fields(entity_row)
+        interest = next(next_id)
+        rows["interest"].append((interest, person, "Chess", "Club", 1, "Weekly"))
+        fields(interest)
+        rows["job"].append((next(next_id), person, "Cashier", "Store", "Detroit"))
+        rows["school"].append(
+            (next(next_id), person, "High School", rng.randint(1, 20), "H", "230000")
+        )
+        relation = next(next_id)
+        rows["relation"].append(
+            (relation, person, "Parent", f"Last{n}", rng.randint(1, 20), 3)
+        )
+        fields(relation)
+        rows["address"].append(
+            (next(next_id), relation, "1 Elm St", "Lansing", "MI", "48901", "US")
+        )
+        rows["job"].append((next(next_id), relation, "Engineer", "Firm", "Flint"))
+        rows["school"].append(
+            (next(next_id), relation, "University", rng.randint(1, 20), "U", "1839")
+        )
+        scores = [rng.randint(200, 800) for _ in range(17)]
+        rows["test"].append(
+            (person, rng.randint(1, 5), 0, "2021-06-01", 1, sum(scores[:2]), *scores)
+        )
+
+    with engine.begin() as conn:
+        for table, values in rows.items():
+            if values:
+                placeholders = ", ".join("?" * len(TABLES[table]))
+                conn.execute(f'insert into "{table}" values ({placeholders})', values)
+    return external_ids
+
+
+def generate_cases(external_ids: list, seed: int = 0) -> list:
+    """
+    Returns raw test case rows, as read from the sheet, covering every
+    destination for every applicant.
+    """
+    rng = random.Random(seed)
+    cases = []
+    idx = 2
+    for external_id in external_ids:
+        for destination, destination_class in destinations.items():
+            if issubclass(destination_class, FieldTestCase):
+                fields = CUSTOM_FIELDS
+            else:
+                fields = DESTINATION_FIELDS[destination]
+            for field in fields:
+                cases.append(
+                    {
+                        "idx": str(idx),
+                        "status": "Untested",
+                        "destination": destination,
+                        "external_id": external_id,
+                        "field": field,
+                        "export": rng.choice(["", "Export 1", "Export 2"]),
+                        "expected": "",
+                        "filters": "",
+                    }
+                )
+                idx += 1
+    return cases
+
+
+def build_database(path: str, applicants: int, seed: int = 0):
+    """Creates and populates a stand-in Slate database, returning its engine."""
+    engine = create_engine(f"sqlite:///{path}")
+    install_shim(engine)
+    create_schema(engine)
+    external_ids = populate(engine, applicants, seed)
+    return engine, external_ids
@@ -0,0 +1,49 @@
+"""
+Rewrites the T-SQL generated by `app.cases` into SQLite so that cases can be
+executed against the stand-in schema built by `benchmarks.schema`.
+
+The rewrites are deliberately narrow: they cover the constructs the Slate
+destinations emit and nothing else.
+"""
+import re
+
+from sqlalchemy import event
+
+REWRITES = [
+    # set-based queries: derived tables can't name their columns in SQLite
+    (
+        re.compile(r"join \(values (.*?)\) as (\w+) \(\[(\w+)\]\)", re.S),
+        r"join (select column1 as [\3] from (values \1)) as \2",
+    ),
+    # custom field table valued functions read from the field_value table
+    (
+        re.compile(r"string_agg\(([^,]+), ('[^']*')\) within group \(order by [^)]+\)"),
+        r"group_concat(\1, \2)",
+    ),
+    (
+        re.compile(r"dbo\.getfield(extended|export|export2)multitable\(([^,]+), ([^)]+)\)"),
+        r"(select [value] from [field_value] where [record] = \2 and [field] = \3 and [kind] = '\1' order by [value])",
+    ),
+    # the test score aggregation is a correlated cross apply
+    (re.compile(r"cross apply \("), "join ("),
+    (re.compile(r"where\s+x\.\[record\] = p\.\[id\]\s+group by"), "group by"),
+    (re.compile(r"\) as t\b"), ") as t on t.[record] = p.[id]"),
+    (re.compile(r"\bsubstring\("), "substr("),
+    (re.compile(r"' \+ "), "' || "),
+]
+
+TOP = re.compile(r"^(\s*select)\s+top 1\b", re.I)
+
+
+def translate(statement: str) -> str:
+    for pattern, replacement in REWRITES:
+        statement = pattern.sub(replacement, statement)
+    if TOP.match(statement):
+        statement = TOP.sub(r"\1", statement) + "\nlimit 1"
+    return statement
+
+
+def install_shim(engine) -> None:
+    @event.listens_for(engine, "before_cursor_execute", retval=True)
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        return translate(statement), parameters
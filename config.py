@@ -13,6 +13,40 @@ class Config:
     GSPREAD_WORKSHEET_NAME = "Test Cases"
     COL_INDEXES = {"status": 2, "actual": 9, "comment": 10}
     SLEEP_INTERVAL = int(os.getenv("SLEEP_INTERVAL", 90))
+    MIN_SLEEP_INTERVAL = int(os.getenv("MIN_SLEEP_INTERVAL", 15))
+    MAX_SLEEP_INTERVAL = int(os.getenv("MAX_SLEEP_INTERVAL", 900))
+    SLEEP_BACKOFF = float(os.getenv("SLEEP_BACKOFF", 2))
+    BATCH_CASES = bool(int(os.getenv("BATCH_CASES", 1)))
+    BATCH_SIZE = int(os.getenv("BATCH_SIZE", 100))
+    SET_BASED = bool(int(os.getenv("SET_BASED", 0)))
+    SET_SIZE = int(os.getenv("SET_SIZE", 500))
+    FETCH_ARRAYSIZE = int(os.getenv("FETCH_ARRAYSIZE", 500))
+    WORKERS = int(os.getenv("WORKERS", 1))
+    EXECUTOR = os.getenv("EXECUTOR", "sync")
+    STREAM_PUBLISH = bool(int(os.getenv("STREAM_PUBLISH", 0)))
+    PUBLISH_BATCH_SIZE = int(os.getenv("PUBLISH_BATCH_SIZE", 500))
+    PUBLISH_INTERVAL = int(os.getenv("PUBLISH_INTERVAL", 30))
+    PUBLISH_QUEUE_SIZE = int(os.getenv("PUBLISH_QUEUE_SIZE", 5000))
+    RESULT_CACHE_TTL = int(os.getenv("RESULT_CACHE_TTL", 0))
+    RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", 10000))
+    PUBLISH_CHUNK_SIZE = int(os.getenv("PUBLISH_CHUNK_SIZE", 5000))
+    PUBLISH_MAX_RETRIES = int(os.getenv("PUBLISH_MAX_RETRIES", 5))
+    PUBLISHER = os.getenv("PUBLISHER", "gsheets")
+    PUBLISHER_PATH = os.getenv("PUBLISHER_PATH")
+    TIMING_REPORT_SIZE = int(os.getenv("TIMING_REPORT_SIZE", 10))
+    SLOW_CASE_THRESHOLD = float(os.getenv("SLOW_CASE_THRESHOLD", 0))
+    TIMING_JSONL = os.getenv("TIMING_JSONL")
+    PLAN_ARTIFACTS_DIR = os.getenv("PLAN_ARTIFACTS_DIR")
+    PS_SNAPSHOTS = bool(int(os.getenv("PS_SNAPSHOTS", 0)))
+    FIELD_PREFETCH = bool(int(os.getenv("FIELD_PREFETCH", 0)))
+    LOOKUP_CACHE = bool(int(os.getenv("LOOKUP_CACHE", 0)))
+    LOOKUP_CACHE_TTL = int(os.getenv("LOOKUP_CACHE_TTL", 0))
+    RESULT_STORE = os.getenv("RESULT_STORE")
+    EXISTENCE_PROBE = bool(int(os.getenv("EXISTENCE_PROBE", 1)))
+    DEDUPE_CASES = bool(int(os.getenv("DEDUPE_CASES", 1)))
+    QUERY_TIMEOUT = float(os.getenv("QUERY_TIMEOUT", 0))
+    RUN_TIME_BUDGET = float(os.getenv("RUN_TIME_BUDGET", 0))
+    CASE_ORDER = os.getenv("CASE_ORDER", "")
 
 
 class DefaultConfig(Config):
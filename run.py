@@ -1,44 +1,189 @@
 import os
 import sys
+import threading
 import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 import click
 
-from app import create_app
+from app import create_app, create_apps
+from app.scheduler import AdaptiveScheduler
+from app.sharding import Shard, aggregate, format_summary
 from config import app_config
 
 
 @click.group()
+@click.option("--publisher", type=click.Choice(["gsheets", "csv", "sqlite"]))
+@click.option("--publisher-path", help="Path to a csv file or SQLite database")
 @click.argument("test_plan")
 @click.pass_context
-def cli(ctx, test_plan):
+def cli(ctx, test_plan, publisher=None, publisher_path=None):
     ctx.ensure_object(dict)
     ctx.obj["TEST_PLAN"] = test_plan.lower()
+    ctx.obj["PUBLISHER"] = publisher
+    ctx.obj["PUBLISHER_PATH"] = publisher_path
+
+
+def run_once(app, shard=None):
+    summary = app.run(filter_func=shard.contains if shard else None)
+    print(app.timing.report())
+    return summary
+
+
+def report_cache(app):
+    if app.cache is not None:
+        print(app.cache.report())
+        app.cache.reset_stats()
+
+
+def get_config(options):
+    config = app_config[options["TEST_PLAN"]]
+    if options["PUBLISHER"]:
+        config.PUBLISHER = options["PUBLISHER"]
+    if options["PUBLISHER_PATH"]:
+        config.PUBLISHER_PATH = options["PUBLISHER_PATH"]
+    if options.get("TEST_MODE"):
+        config.TEST_MODE = options["TEST_MODE"]
+    if options.get("WORKERS"):
+        config.WORKERS = options["WORKERS"]
+    if options.get("EXECUTOR"):
+        config.EXECUTOR = options["EXECUTOR"]
+    if config.PUBLISHER in ("csv", "sqlite") and not config.PUBLISHER_PATH:
+        raise click.UsageError(
+            f"The {config.PUBLISHER} publisher needs PUBLISHER_PATH or --publisher-path"
+        )
+    return config
+
+
+def run_shard(options, shard):
+    """Runs one shard of a test plan in a worker process."""
+    app = create_app(get_config(options))
+    print(f"Running shard {shard}...")
+    return run_once(app, shard)
 
 
 @cli.command()
 @click.option("--loop", is_flag=True)
 @click.option("--mode")
+@click.option("--workers", type=int, help="Number of cases to execute concurrently")
+@click.option("--executor", type=click.Choice(["sync", "async"]))
+@click.option("--shard", help="Only run shard i of N, eg 1/4")
+@click.option("--processes", type=int, help="Split the run across local processes")
 @click.pass_context
-def run(ctx, loop, mode=None):
-    plan = ctx.obj["TEST_PLAN"]
-    config = app_config[plan]
-    if mode:
-        config.TEST_MODE = mode
+def run(
+    ctx, loop, mode=None, workers=None, executor=None, shard=None, processes=None
+):
+    options = dict(ctx.obj, TEST_MODE=mode, WORKERS=workers, EXECUTOR=executor)
+    try:
+        shard = Shard.parse(shard) if shard else None
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--shard")
+    if processes:
+        if loop:
+            raise click.UsageError("--loop can't be combined with --processes")
+        if get_config(options).PUBLISHER == "csv":
+            # each process would rewrite the whole file
+            raise click.UsageError("The csv publisher can't be shared by processes")
+        if shard:
+            shards = shard.split(processes)
+        else:
+            shards = [Shard(i, processes) for i in range(processes)]
+        summaries = []
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            futures = [pool.submit(run_shard, options, s) for s in shards]
+            for future in as_completed(futures):
+                summaries.append(future.result())
+                print(f"{len(summaries)} of {len(shards)} shards finished")
+        print(format_summary(aggregate(summaries)))
+        return
+    config = get_config(options)
     app = create_app(config)
     if loop:
+        scheduler = AdaptiveScheduler.from_config(config)
         while True:
-            app.run()
-            print("Sleeping...")
-            time.sleep(config.SLEEP_INTERVAL)
-    app.run()
+            summary = run_once(app, shard)
+            report_cache(app)
+            delay = scheduler.next_delay(
+                summary["cases"],
+                summary["untested"],
+                summary["seconds"],
+                summary["deferred"],
+            )
+            print(scheduler.report(delay))
+            time.sleep(delay)
+    run_once(app, shard)
+
+
+def plan_names(value: str) -> list:
+    if value == "all":
+        return [plan for plan in app_config if plan != "default"]
+    plans = [plan.strip() for plan in value.split(",")]
+    unknown = [plan for plan in plans if plan not in app_config]
+    if unknown:
+        raise click.BadParameter(f"Unknown test plans: {', '.join(unknown)}")
+    return plans
+
+
+def run_plan(plan, app, loop):
+    """Runs one plan of `run-all`, on its own schedule when looping."""
+    scheduler = AdaptiveScheduler.from_config(app.config)
+    while True:
+        print(f"Running {plan}...")
+        began = time.monotonic()
+        try:
+            summary = run_once(app)
+        except Exception:
+            # one failing plan shouldn't stop the others
+            traceback.print_exc()
+            summary = None
+        report_cache(app)
+        if not loop:
+            return summary
+        if summary is None:
+            # back off as if there was nothing to test
+            delay = scheduler.next_delay(0, 0, time.monotonic() - began)
+        else:
+            delay = scheduler.next_delay(
+                summary["cases"],
+                summary["untested"],
+                summary["seconds"],
+                summary["deferred"],
+            )
+        print(f"{plan}: {scheduler.report(delay)}")
+        time.sleep(delay)
+
+
+@cli.command("run-all")
+@click.option("--loop", is_flag=True)
+@click.option("--workers", type=int, help="Number of cases to execute concurrently")
+@click.option("--executor", type=click.Choice(["sync", "async"]))
+@click.pass_context
+def run_all(ctx, loop, workers=None, executor=None):
+    """
+    Runs several test plans, given as `all` or plan1,plan2, concurrently in
+    one process.
+    """
+    plans = plan_names(ctx.obj["TEST_PLAN"])
+    options = dict(ctx.obj, WORKERS=workers, EXECUTOR=executor)
+    configs = [get_config(dict(options, TEST_PLAN=plan)) for plan in plans]
+    apps = create_apps(configs)
+    # daemon threads, so Ctrl-C stops a loop
+    threads = [
+        threading.Thread(target=run_plan, args=(plan, app, loop), daemon=True)
+        for plan, app in zip(plans, apps)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
 
 
 @cli.command()
 @click.pass_context
 def reset(ctx):
     plan = ctx.obj["TEST_PLAN"]
-    config = app_config[plan]
+    config = get_config(ctx.obj)
     app = create_app(config)
     print(f"Resetting all tests for {plan}...")
     app.publisher.reset_tests()
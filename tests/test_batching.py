@@ -0,0 +1,191 @@
+import pytest
+from sqlalchemy import create_engine, event
+
+from app.batching import (
+    batch_sql,
+    execute_batch,
+    execute_set,
+    group_by_applicant,
+    group_by_destination,
+)
+from app.cases import NOT_FOUND, Person, PersonField, build_case
+from app.ps_cases import AdmApplData
+from benchmarks.schema import build_database, generate_cases
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    engine.execute(
+        "create table ps_adm_appl_data (adm_appl_nbr text, emplid text, admit_term text)"
+    )
+    engine.execute("insert into ps_adm_appl_data values ('001', 'E1', '2210')")
+    engine.execute("insert into ps_adm_appl_data values ('002', 'E2', '2220')")
+    engine.execute("insert into ps_adm_appl_data values ('002', 'E2', '2230')")
+    engine.execute("create table dual (dummy text)")
+    engine.execute("insert into dual values ('X')")
+    return engine
+
+
+def ps_case(idx, adm_appl_nbr, field, expected="", filters=None):
+    return AdmApplData(
+        idx=idx,
+        adm_appl_nbr=adm_appl_nbr,
+        field=field,
+        expected=expected,
+        filters=filters,
+    )
+
+
+def test_group_by_applicant():
+    cases = [
+        Person(1, "app1", "first", "", "A"),
+        Person(2, "app2", "first", "", "B"),
+        Person(3, "app1", "last", "", "C"),
+        Person(4, "app1", "last", "", "C", filters="p.[x] = 1"),
+    ]
+    batches = group_by_applicant(cases)
+    assert [[c.idx for c in batch] for batch in batches] == [[1, 3], [2], [4]]
+
+
+def test_group_by_applicant_max_size():
+    cases = [Person(i, "app1", f"field{i}", "", "") for i in range(5)]
+    assert [len(b) for b in group_by_applicant(cases, max_size=2)] == [2, 2, 1]
+
+
+def test_batch_sql_aliases_each_case():
+    cases = [Person(1, "app1", "first", "", ""), Person(2, "app1", "last", "", "")]
+    sql, params = batch_sql(cases)
+    assert "p.[first] as [actual_0]" in sql
+    assert "p.[last] as [actual_1]" in sql
+    assert sql.count("from application a") == 1
+    assert params == {"external_id": "app1"}
+
+
+def test_batch_sql_prefixes_export_params():
+    cases = [
+        PersonField(1, "app1", "sport", "", ""),
+        PersonField(2, "app1", "hobby", "Export 1", ""),
+    ]
+    sql, params = batch_sql(cases)
+    assert ":c0_field" in sql and ":c1_field" in sql
+    assert params == {"c0_field": "sport", "c1_field": "hobby", "external_id": "app1"}
+    assert cases[0].params == {"external_id": "app1", "field": "sport"}
+
+
+def test_sql_is_identical_across_applicants():
+    first = PersonField(1, "app1", "sport", "", "")
+    second = PersonField(2, "app2", "sport", "", "")
+    assert first.sql == second.sql
+    assert "app1" not in first.sql
+    assert first.params != second.params
+
+
+def test_execute_batch_fans_out_results(db):
+    cases = [
+        ps_case(2, "001", "emplid", "E1"),
+        ps_case(3, "001", "admit_term", "2210"),
+    ]
+    execute_batch(db, cases)
+    assert [c.actual for c in cases] == ["E1", "2210"]
+    assert [c.status for c in cases] == ["Pass", "Pass"]
+
+
+def test_execute_batch_missing_applicant(db):
+    cases = [ps_case(2, "003", "emplid"), ps_case(3, "003", "admit_term")]
+    execute_batch(db, cases)
+    assert [c.actual for c in cases] == [NOT_FOUND, NOT_FOUND]
+
+
+def test_execute_batch_isolates_errors(db):
+    cases = [
+        ps_case(2, "001", "emplid", "E1"),
+        ps_case(3, "001", "not_a_column"),
+    ]
+    execute_batch(db, cases)
+    assert cases[0].status == "Pass"
+    assert cases[1].status == "Error"
+    assert "not_a_column" in cases[1].actual
+
+
+def test_group_by_destination_keeps_applicants_together():
+    cases = [
+        Person(1, "app1", "first", "", ""),
+        Person(2, "app2", "first", "", ""),
+        Person(3, "app1", "last", "", ""),
+        Person(4, "app3", "first", "", ""),
+    ]
+    batches = group_by_destination(cases, max_keys=2)
+    assert [[c.idx for c in batch] for batch in batches] == [[1, 3, 2], [4]]
+
+
+def test_execute_set_demultiplexes_rows(db):
+    cases = [
+        ps_case(2, "001", "emplid", "E1"),
+        ps_case(3, "002", "emplid", "E2"),
+        ps_case(4, "002", "admit_term"),
+        ps_case(5, "003", "emplid"),
+    ]
+    execute_set(db, cases)
+    assert cases[0].actual == "E1"
+    assert cases[1].actual == "E2"
+    assert cases[2].actual in ("2220", "2230")
+    assert cases[3].actual == NOT_FOUND
+
+
+def test_execute_set_falls_back_on_error(db):
+    cases = [
+        ps_case(2, "001", "emplid", "E1"),
+        ps_case(3, "002", "not_a_column"),
+    ]
+    execute_set(db, cases)
+    assert cases[0].status == "Pass"
+    assert cases[1].status == "Error"
+
+
+def test_execute_set_matches_per_case_queries(tmp_path):
+    engine, external_ids = build_database(str(tmp_path / "slate.db"), 5)
+    raw_cases = generate_cases(external_ids)
+    in_sets = [build_case(**c) for c in raw_cases]
+    expected = [build_case(**c) for c in raw_cases]
+    for test_case in expected:
+        test_case.execute(engine)
+    for batch in group_by_destination(in_sets):
+        execute_set(engine, batch)
+    assert any(isinstance(c, PersonField) for c in in_sets)
+    assert [c.actual for c in in_sets] == [c.actual for c in expected]
+
+
+def test_execute_set_ps_cases_with_and_without_filters(db):
+    def make_cases():
+        return [
+            ps_case(2, "001", "emplid"),
+            ps_case(3, "002", "emplid"),
+            ps_case(4, "001", "admit_term", filters="a.admit_term = '2230'"),
+            ps_case(5, "002", "admit_term", filters="a.admit_term = '2230'"),
+            ps_case(6, "003", "admit_term", filters="a.admit_term = '2230'"),
+        ]
+
+    in_sets = make_cases()
+    expected = make_cases()
+    for test_case in expected:
+        test_case.execute(db)
+    statements = []
+    event.listen(db, "before_cursor_execute", lambda *args: statements.append(1))
+    for batch in group_by_destination(in_sets):
+        execute_set(db, batch)
+    # one query per group, without falling back to per-applicant batches
+    assert len(statements) == 2
+    assert [c.actual for c in in_sets] == [c.actual for c in expected]
+    assert [c.actual for c in in_sets] == ["E1", "E2", NOT_FOUND, "2230", NOT_FOUND]
+
+
+def test_execute_batch_bisects_failing_batches(db):
+    cases = [ps_case(i, "001", "emplid", "E1") for i in range(2, 9)]
+    cases.append(ps_case(9, "001", "not_a_column"))
+    statements = []
+    event.listen(db, "before_cursor_execute", lambda *args: statements.append(1))
+    execute_batch(db, cases)
+    assert [c.status for c in cases] == ["Pass"] * 7 + ["Error"]
+    # 8 -> 4 + 4 -> 2 + 2 -> 1 + 1, rather than one query per case
+    assert len(statements) == 7
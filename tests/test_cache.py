@@ -0,0 +1,54 @@
+import pytest
+
+from app.cache import ResultCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def test_cache_hit_within_ttl(clock):
+    cache = ResultCache(ttl=60, clock=clock)
+    cache.set("sql", "value", "app1")
+    clock.now = 59
+    assert cache.get("sql") == (True, "value")
+    assert (cache.hits, cache.misses) == (1, 0)
+
+
+def test_cache_expires_after_ttl(clock):
+    cache = ResultCache(ttl=60, clock=clock)
+    cache.set("sql", "value", "app1")
+    clock.now = 60
+    assert cache.get("sql") == (False, None)
+    assert len(cache) == 0
+    assert cache.misses == 1
+
+
+def test_cache_evicts_least_recently_used(clock):
+    cache = ResultCache(ttl=60, maxsize=2, clock=clock)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") == (False, None)
+    assert cache.get("a") == (True, 1)
+    assert cache.get("c") == (True, 3)
+
+
+def test_cache_invalidate_by_external_id(clock):
+    cache = ResultCache(ttl=60, clock=clock)
+    cache.set("a", 1, "app1")
+    cache.set("b", 2, "app2")
+    cache.set("c", 3, "app1")
+    assert cache.invalidate("app1") == 2
+    assert cache.get("b") == (True, 2)
+    assert len(cache) == 1
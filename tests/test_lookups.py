@@ -0,0 +1,51 @@
+from app.batching import execute_set, group_by_destination
+from app.cases import build_case
+from app.lookups import LookupCache
+from benchmarks.schema import build_database, generate_cases
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_decoded_cases_match_lookup_subqueries(tmp_path):
+    engine, external_ids = build_database(str(tmp_path / "slate.db"), 10)
+    raw_cases = [
+        c
+        for c in generate_cases(external_ids)
+        if c["destination"] in ["application", "relationship", "school"]
+    ]
+    lookups = LookupCache(engine)
+    decoded = [build_case(**c) for c in raw_cases]
+    for test_case in decoded:
+        test_case.lookups = lookups
+    expected = [build_case(**c) for c in raw_cases]
+    for cases in [decoded, expected]:
+        for batch in group_by_destination(cases):
+            execute_set(engine, batch)
+
+    assert [c.actual for c in decoded] == [c.actual for c in expected]
+    assert {c.actual for c in decoded if c.field == "period"} <= {
+        "Fall 2021",
+        "Fall 2022",
+    }
+    assert "lookup" not in decoded[1].sql
+    assert lookups.loads == 4
+
+
+def test_lookup_tables_reload_after_ttl(tmp_path):
+    engine, _ = build_database(str(tmp_path / "slate.db"), 1)
+    clock = Clock()
+    lookups = LookupCache(engine, ttl=60, clock=clock)
+    assert lookups.decode(["lookup.round"], 2) == "Regular Decision"
+    engine.execute("update [lookup.round] set name = 'RD' where id = 2")
+    clock.now = 30
+    assert lookups.decode(["lookup.round"], 2) == "Regular Decision"
+    clock.now = 61
+    assert lookups.decode(["lookup.round"], 2) == "RD"
+    assert lookups.decode(["lookup.round.period", "lookup.period"], None) is None
+    assert lookups.decode(["lookup.round"], 99) is None
@@ -0,0 +1,36 @@
+import sqlite3
+
+from sqlalchemy import create_engine, event
+
+from app.oracle import install_prefetch
+
+
+class PrefetchCursor(sqlite3.Cursor):
+    prefetchrows = 2
+
+
+class PrefetchConnection(sqlite3.Connection):
+    def cursor(self, factory=PrefetchCursor):
+        return super().cursor(factory)
+
+
+def test_prefetch_is_set_before_each_query():
+    engine = create_engine(
+        "sqlite://",
+        creator=lambda: sqlite3.connect(":memory:", factory=PrefetchConnection),
+    )
+    install_prefetch(engine, 500)
+    cursors = []
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        cursors.append(cursor)
+
+    assert engine.execute("select 1").scalar() == 1
+    assert [cursor.prefetchrows for cursor in cursors] == [501]
+
+
+def test_prefetch_skips_drivers_without_it():
+    engine = create_engine("sqlite://")
+    install_prefetch(engine, 500)
+    assert engine.execute("select 1").scalar() == 1
@@ -0,0 +1,40 @@
+import pytest
+
+from app.ordering import CaseOrder
+from app.ps_cases import build_case
+from tests.test_executor import raw_case
+
+
+def make_cases():
+    return [
+        build_case(**raw_case(2, "000")),
+        build_case(**raw_case(3, "001", status="Fail")),
+        build_case(**dict(raw_case(4, "002", status="Error"), destination="phone")),
+        build_case(**raw_case(5, "003", status="Error")),
+    ]
+
+
+def idxs(test_cases):
+    return [test_case.idx for test_case in test_cases]
+
+
+def test_status_orders_errors_first_and_keeps_sheet_order():
+    order = CaseOrder(["status"])
+    assert idxs(order.sort(make_cases())) == [4, 5, 3, 2]
+
+
+def test_recent_rows_first():
+    order = CaseOrder(["recent", "status"], changed_rows={3, 5})
+    assert idxs(order.sort(make_cases())) == [5, 3, 4, 2]
+
+
+def test_fastest_destinations_first():
+    cases = make_cases()
+    order = CaseOrder(["latency"], latencies={"AdmApplData": 0.5, "Phone": 0.1})
+    assert idxs(order.sort(cases)) == [4, 2, 3, 5]
+
+
+def test_unknown_order():
+    assert CaseOrder.parse(" status, latency ,") == ["status", "latency"]
+    with pytest.raises(ValueError):
+        CaseOrder(["slowest"])
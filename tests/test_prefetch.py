@@ -0,0 +1,57 @@
+from app.batching import execute_batch, group_by_applicant
+from app.cases import NOT_FOUND, FieldTestCase, PersonField, build_case
+from app.prefetch import FieldPrefetch
+from benchmarks.schema import build_database, generate_cases
+
+
+def test_prefetch_matches_per_case_queries(tmp_path):
+    engine, external_ids = build_database(str(tmp_path / "slate.db"), 20)
+    raw_cases = [
+        c
+        for c in generate_cases(external_ids)
+        if issubclass(type(build_case(**c)), FieldTestCase)
+    ]
+    raw_cases.append(
+        {**raw_cases[0], "idx": 1000, "external_id": "missing", "filters": None}
+    )
+    prefetched = [build_case(**c) for c in raw_cases]
+    expected = [build_case(**c) for c in raw_cases]
+    for batch in group_by_applicant(expected):
+        execute_batch(engine, batch)
+
+    stage = FieldPrefetch(engine, max_keys=8)
+    answered, pending = stage.resolve(prefetched)
+
+    assert pending == [] and len(answered) == len(prefetched)
+    assert [c.actual for c in prefetched] == [c.actual for c in expected]
+    assert prefetched[-1].actual == NOT_FOUND
+    keys = {}
+    for c in prefetched:
+        keys.setdefault((type(c), c.export.lower()), set()).add(c.external_id)
+    # one query per destination and export for every 8 applicants
+    assert stage.queries == sum(-(-len(k) // 8) for k in keys.values())
+    assert stage.queries < len(group_by_applicant(expected))
+
+
+def test_prefetch_skips_filtered_and_non_field_cases(tmp_path):
+    engine, external_ids = build_database(str(tmp_path / "slate.db"), 2)
+    filtered = PersonField(2, external_ids[0], "sport", "", "", filters="1 = 1")
+    person = build_case(
+        "person", idx=3, external_id=external_ids[0], field="first", export="", expected=""
+    )
+    answered, pending = FieldPrefetch(engine).resolve([filtered, person])
+    assert answered == [] and pending == [filtered, person]
+
+
+def test_prefetch_binds_only_each_chunks_keys(tmp_path):
+    engine, external_ids = build_database(str(tmp_path / "slate.db"), 3)
+    sent = []
+
+    class RecordingDb:
+        def execute(self, sql, params):
+            sent.append(sorted(params))
+            return engine.execute(sql, params)
+
+    cases = [PersonField(i, key, "sport", "", "") for i, key in enumerate(external_ids)]
+    FieldPrefetch(RecordingDb(), max_keys=2).resolve(cases)
+    assert sent == [["field_0", "key_0", "key_1"], ["field_0", "key_0"]]
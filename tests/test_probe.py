@@ -0,0 +1,38 @@
+from sqlalchemy import create_engine, event
+
+from app.cases import NOT_FOUND, build_case
+from app.probe import ExistenceProbe
+from app.ps_cases import AdmApplData
+from benchmarks.schema import build_database
+
+
+def ps_case(idx, adm_appl_nbr, field="emplid"):
+    return AdmApplData(idx=idx, adm_appl_nbr=adm_appl_nbr, field=field, expected="")
+
+
+def test_probe_marks_missing_applicants():
+    db = create_engine("sqlite://")
+    db.execute("create table ps_adm_appl_data (adm_appl_nbr text, emplid text)")
+    db.execute("insert into ps_adm_appl_data values ('001', 'E1')")
+    statements = []
+    event.listen(db, "after_cursor_execute", lambda *args: statements.append(args[2]))
+    cases = [ps_case(2, "001"), ps_case(3, "002"), ps_case(4, "002", "admit_term")]
+    probe = ExistenceProbe(db)
+    answered, pending = probe.resolve(cases)
+    assert len(statements) == 1
+    assert pending == cases[:1] and answered == cases[1:]
+    assert [c.actual for c in answered] == [NOT_FOUND, NOT_FOUND]
+    assert probe.report().startswith("1 applicants not found, 2 cases")
+
+
+def test_probe_slate_applicants(tmp_path):
+    engine, external_ids = build_database(str(tmp_path / "slate.db"), 3)
+    cases = [
+        build_case(
+            "person", idx=i, external_id=key, field="first", export="", expected=""
+        )
+        for i, key in enumerate(external_ids + ["app9999999"])
+    ]
+    answered, pending = ExistenceProbe(engine, max_keys=2).resolve(cases)
+    assert [c.external_id for c in answered] == ["app9999999"]
+    assert len(pending) == 3
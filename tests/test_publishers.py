@@ -0,0 +1,268 @@
+import csv
+import sqlite3
+
+import gspread
+import pytest
+
+from app import publishers
+from app.ps_cases import AdmApplData
+from app.publishers import CSVPublisher, GoogleSheetsPublisher, SQLitePublisher
+from app.utils import cells_to_ranges
+
+HEADER = ["Idx", "Status", "Destination", "External ID", "Field", "Actual"]
+
+
+class FakeResponse:
+    def __init__(self, version):
+        self.version = version
+
+    def json(self):
+        return {"version": self.version}
+
+
+class FakeClient:
+    def __init__(self):
+        self.version = "1"
+
+    def request(self, method, endpoint, params=None):
+        return FakeResponse(self.version)
+
+
+class FakeWorksheet:
+    def __init__(self, values):
+        self.values = values
+        self.reads = 0
+
+        self.updates = []
+        self.errors = []
+
+    def get_all_values(self):
+        self.reads += 1
+        return [list(row) for row in self.values]
+
+    def batch_update(self, data, value_input_option=None):
+        if self.errors:
+            raise self.errors.pop()
+        self.updates.append(data)
+
+
+class RateLimited:
+    status_code = 429
+    text = "Quota exceeded"
+
+    def json(self):
+        raise ValueError
+
+
+@pytest.fixture
+def publisher():
+    publisher = GoogleSheetsPublisher(
+        "credential.json", "sheet-key", col_indexes={"status": 2, "actual": 6}
+    )
+    publisher._client = FakeClient()
+    publisher._wks = FakeWorksheet(
+        [
+            HEADER,
+            ["2", "Untested", "person", "app1", "first", ""],
+            ["3", "Pass", "person", "app1", "last", "Smith"],
+        ]
+    )
+    return publisher
+
+
+def test_get_cases_aliases_headers(publisher):
+    cases = publisher.get_cases(["Untested"])
+    assert cases == [
+        {
+            "idx": "2",
+            "status": "Untested",
+            "destination": "person",
+            "external_id": "app1",
+            "field": "first",
+            "actual": "",
+        }
+    ]
+
+
+def test_get_records_skips_download_when_revision_unchanged(publisher):
+    publisher.get_records()
+    publisher.get_records()
+    assert publisher.worksheet.reads == 1
+    assert publisher.changed_rows == set()
+
+
+def test_get_records_reparses_changed_rows_only(publisher):
+    first = publisher.get_records()
+    assert publisher.changed_rows == {2, 3}
+    publisher.client.version = "2"
+    publisher.worksheet.values[1][1] = "Fail"
+    second = publisher.get_records()
+    assert publisher.worksheet.reads == 2
+    assert publisher.changed_rows == {2}
+    assert second[0]["status"] == "Fail"
+    assert second[1] is first[1]
+
+
+def result(idx, actual, expected):
+    test_case = AdmApplData(
+        idx=idx, adm_appl_nbr="001", field="field", expected=expected
+    )
+    test_case.store_result(actual)
+    return test_case
+
+
+def test_cells_to_ranges():
+    cells = [(3, 2, "Fail"), (2, 2, "Pass"), (5, 2, "Pass"), (2, 9, "x")]
+    assert cells_to_ranges(cells) == [
+        {"range": "B2:B3", "values": [["Pass"], ["Fail"]]},
+        {"range": "B5:B5", "values": [["Pass"]]},
+        {"range": "I2:I2", "values": [["x"]]},
+    ]
+
+
+def test_publish_writes_changed_cells_only(publisher):
+    publisher.get_cases(["Untested"])
+    publisher.publish([result(2, "Jane", "Jane"), result(3, "Smith", "Smith")])
+    assert publisher.worksheet.updates == [
+        [
+            {"range": "B2:B2", "values": [["Pass"]]},
+            {"range": "F2:F2", "values": [["Jane"]]},
+        ]
+    ]
+    assert publisher.last_publish == {"cells": 2, "skipped": 2, "requests": 1}
+    # the snapshot reflects what was written
+    publisher.publish([result(2, "Jane", "Jane")])
+    assert publisher.last_publish["cells"] == 0
+    assert publisher.get_records()[0]["status"] == "Pass"
+
+
+def test_publish_writes_duration_column(publisher):
+    publisher.col_indexes["duration"] = 7
+    timed = result(2, "Jane", "Jane")
+    timed.timings = {"build": 0.0001, "execute": 0.25, "fetch": 0.0}
+    publisher.publish([timed, result(3, "Smith", "Smith")])
+    assert {"range": "G2:G2", "values": [[0.25]]} in publisher.worksheet.updates[0]
+    assert publisher.last_publish["cells"] == 5
+
+
+def test_share_client_between_sheets(publisher):
+    other = GoogleSheetsPublisher("credential.json", "other-sheet-key")
+    clients = {}
+    publisher.share_client(clients)
+    other.share_client(clients)
+    assert other.client is publisher.client
+    assert clients == {"credential.json": publisher.client}
+
+
+def test_publish_chunks_requests(publisher):
+    publisher.chunk_size = 3
+    publisher.publish([result(i, "x", "y") for i in range(2, 6)])
+    assert len(publisher.worksheet.updates) == 3
+    assert publisher.last_publish["requests"] == 3
+
+
+def test_publish_retries_rate_limited_writes(publisher, monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(publishers.time, "sleep", sleeps.append)
+    publisher.worksheet.errors = [
+        gspread.exceptions.APIError(RateLimited()),
+        gspread.exceptions.APIError(RateLimited()),
+    ]
+    publisher.publish([result(2, "x", "x")])
+    assert sleeps == [2.0, 4.0]
+    assert len(publisher.worksheet.updates) == 1
+
+
+def test_reset_tests_skips_untested_rows(publisher):
+    publisher.reset_tests()
+    assert publisher.worksheet.updates == [
+        [
+            {"range": "B3:B3", "values": [["Untested"]]},
+            {"range": "F3:F3", "values": [[""]]},
+        ]
+    ]
+
+
+ROWS = [
+    ["2", "Untested", "person", "app1", "first", ""],
+    ["3", "Pass", "person", "app1", "last", "Smith"],
+]
+
+
+@pytest.fixture
+def csv_publisher(tmp_path):
+    path = tmp_path / "cases.csv"
+    with open(path, "w", newline="") as f:
+        csv.writer(f).writerows([HEADER] + ROWS)
+    return CSVPublisher(str(path), col_indexes={"status": 2, "actual": 6})
+
+
+@pytest.fixture
+def sqlite_publisher(tmp_path):
+    path = str(tmp_path / "cases.db")
+    with sqlite3.connect(path) as conn:
+        columns = ", ".join(f'"{h}"' for h in HEADER)
+        conn.execute(f"create table test_cases ({columns})")
+        conn.executemany("insert into test_cases values (?, ?, ?, ?, ?, ?)", ROWS)
+    return SQLitePublisher(path, "test_cases", col_indexes={"status": 2, "actual": 6})
+
+
+def reopen(publisher):
+    if isinstance(publisher, SQLitePublisher):
+        return SQLitePublisher(publisher.path, publisher.table, publisher.col_indexes)
+    return CSVPublisher(publisher.path, publisher.col_indexes)
+
+
+@pytest.mark.parametrize("backend", ["csv_publisher", "sqlite_publisher"])
+def test_offline_publishers_round_trip(backend, request):
+    publisher = request.getfixturevalue(backend)
+    cases = publisher.get_cases(["Untested"])
+    assert [c["external_id"] for c in cases] == ["app1"]
+    publisher.publish([result(2, "Jane", "Jane")])
+    assert publisher.last_publish["cells"] == 2
+    records = reopen(publisher).get_records()
+    assert [r["status"] for r in records] == ["Pass", "Pass"]
+    assert records[0]["actual"] == "Jane"
+    publisher.reset_tests()
+    records = reopen(publisher).get_records()
+    assert [r["status"] for r in records] == ["Untested", "Untested"]
+    assert [r["actual"] for r in records] == ["", ""]
+
+
+def test_shared_clients_share_a_lock(publisher):
+    other = GoogleSheetsPublisher("credential.json", "other-sheet-key")
+    separate = GoogleSheetsPublisher("other.json", "sheet-key")
+    separate._client = FakeClient()
+    clients = {}
+    publisher.share_client(clients)
+    other.share_client(clients)
+    assert other.lock is publisher.lock
+    assert separate.lock is not publisher.lock
+
+
+def test_sqlite_publisher_closes_connections(sqlite_publisher, monkeypatch):
+    opened = []
+    real_connect = sqlite3.connect
+
+    def connect(path):
+        opened.append(real_connect(path))
+        return opened[-1]
+
+    monkeypatch.setattr(publishers.sqlite3, "connect", connect)
+    sqlite_publisher.publish([result(2, "Jane", "Jane")])
+    assert len(opened) == 2
+    for conn in opened:
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute("select 1")
+
+
+@pytest.mark.parametrize("publisher_class", [CSVPublisher, SQLitePublisher])
+def test_offline_publishers_need_a_path(publisher_class):
+    class NoPath:
+        PUBLISHER = "offline"
+        PUBLISHER_PATH = None
+        TEST_MODE = None
+        COL_INDEXES = {"status": 2, "actual": 6}
+
+    with pytest.raises(ValueError, match="PUBLISHER_PATH"):
+        publisher_class.from_config(NoPath)
@@ -0,0 +1,28 @@
+from app.scheduler import AdaptiveScheduler
+
+
+def test_backs_off_while_idle():
+    scheduler = AdaptiveScheduler(90, min_interval=15, max_interval=400)
+    delays = [scheduler.next_delay(0, 0, 1) for _ in range(4)]
+    assert delays == [179, 359, 399, 399]
+    assert "idle" in scheduler.report(delays[-1])
+
+
+def test_new_cases_tighten_the_interval():
+    scheduler = AdaptiveScheduler(90, min_interval=15)
+    scheduler.next_delay(0, 0, 1)
+    assert scheduler.next_delay(20, 5, 2) == 15
+    assert scheduler.interval == 15
+    # retesting failures returns to the base interval, less the run time
+    assert scheduler.next_delay(3, 0, 30) == 60
+
+
+def test_runs_never_overlap():
+    scheduler = AdaptiveScheduler(90, min_interval=15)
+    assert scheduler.next_delay(500, 0, 200) == 15
+
+
+def test_deferred_cases_tighten_the_interval():
+    scheduler = AdaptiveScheduler(90, min_interval=15)
+    assert scheduler.next_delay(40, 0, 10, deferred=12) == 15
+    assert "deferred" in scheduler.report(15)
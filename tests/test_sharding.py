@@ -0,0 +1,67 @@
+import pytest
+
+from app.sharding import Shard, aggregate, format_summary
+
+
+def records(count):
+    return [{"external_id": f"app{i:05}"} for i in range(count)]
+
+
+def test_shards_partition_cases():
+    shards = [Shard(i, 4) for i in range(4)]
+    cases = records(400)
+    owners = [[s for s in shards if s.contains(c)] for c in cases]
+    assert all(len(o) == 1 for o in owners)
+    sizes = [sum(1 for o in owners if o[0] is s) for s in shards]
+    assert min(sizes) > 50
+
+
+def test_split_shards_partition_their_parent():
+    parent = Shard.parse("2/3")
+    children = parent.split(2)
+    assert [str(c) for c in children] == ["2/3.1/2", "2/3.2/2"]
+    for case in records(300):
+        owners = [c for c in children if c.contains(case)]
+        assert len(owners) == (1 if parent.contains(case) else 0)
+
+
+def test_shard_by_peoplesoft_application():
+    shard = Shard(0, 2)
+    case = {"adm_appl_nbr": "00012345", "field": "emplid"}
+    assert shard.contains(case) == shard.contains({"adm_appl_nbr": "00012345"})
+
+
+@pytest.mark.parametrize("value", ["0/4", "5/4", "two/4", "1"])
+def test_parse_rejects_invalid_shards(value):
+    with pytest.raises(ValueError):
+        Shard.parse(value)
+
+
+def test_aggregate_summaries():
+    summaries = [
+        {
+            "cases": 3,
+            "untested": 1,
+            "skipped": 0,
+            "deduplicated": 0,
+            "deferred": 0,
+            "statuses": {"Pass": 2, "Fail": 1},
+            "seconds": 4.0,
+            "destinations": {"Person": (3, 0.3, 0.2)},
+        },
+        {
+            "cases": 2,
+            "untested": 0,
+            "skipped": 2,
+            "deduplicated": 1,
+            "deferred": 0,
+            "statuses": {"Pass": 2},
+            "seconds": 6.5,
+            "destinations": {"Person": (1, 0.1, 0.1), "Address": (1, 0.5, 0.5)},
+        },
+    ]
+    summary = aggregate(summaries)
+    assert summary["statuses"] == {"Pass": 4, "Fail": 1}
+    assert summary["seconds"] == 6.5
+    assert summary["destinations"]["Person"] == (4, pytest.approx(0.4), 0.2)
+    assert format_summary(summary).startswith("2 shards ran 5 cases in 6.5s")
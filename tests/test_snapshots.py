@@ -0,0 +1,62 @@
+import pytest
+from sqlalchemy import create_engine, event
+
+from app.cases import NOT_FOUND
+from app.ps_cases import AdmApplData, PrimaryName
+from app.snapshots import SnapshotStage
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    engine.execute("create table ps_adm_appl_data (adm_appl_nbr text, emplid text)")
+    engine.execute(
+        "create table ps_names "
+        "(emplid text, name_type text, effdt text, first_name text, last_name text)"
+    )
+    for i in range(1, 4):
+        engine.execute(f"insert into ps_adm_appl_data values ('00{i}', 'E{i}')")
+    engine.execute("insert into ps_names values ('E1', 'PRI', '2020-01-01', 'Jo', 'Li')")
+    engine.execute("insert into ps_names values ('E1', 'PRI', '2021-01-01', 'Jane', 'Li')")
+    engine.execute("insert into ps_names values ('E2', 'PRI', '2020-01-01', 'Sam', 'Ng')")
+    engine.execute("create table dual (dummy text)")
+    engine.execute("insert into dual values ('X')")
+    return engine
+
+
+def name_case(idx, adm_appl_nbr, field, filters=None):
+    return PrimaryName(
+        idx=idx, adm_appl_nbr=adm_appl_nbr, field=field, expected="", filters=filters
+    )
+
+
+def test_snapshot_answers_unfiltered_columns(db):
+    statements = []
+    event.listen(
+        db, "after_cursor_execute", lambda *args: statements.append(args[2])
+    )
+    cases = [
+        name_case(2, "001", "first_name"),
+        name_case(3, "001", "last_name"),
+        name_case(4, "002", "first_name"),
+        name_case(5, "003", "first_name"),
+    ]
+    answered, pending = SnapshotStage(db).resolve(cases)
+    assert len(statements) == 1
+    assert answered == cases and pending == []
+    assert [c.actual for c in cases] == ["Jane", "Li", "Sam", NOT_FOUND]
+    assert all(c.duration is not None for c in cases)
+
+
+def test_snapshot_leaves_other_cases_pending(db):
+    filtered = name_case(2, "001", "first_name", filters="n.effdt > '2020-06-01'")
+    missing_column = name_case(3, "001", "middle_name")
+    not_effective_dated = AdmApplData(
+        idx=4, adm_appl_nbr="001", field="emplid", expected=""
+    )
+    answered, pending = SnapshotStage(db).resolve(
+        [filtered, missing_column, not_effective_dated]
+    )
+    assert answered == []
+    assert pending == [filtered, not_effective_dated, missing_column]
+    assert not any(c.executed for c in pending)
@@ -0,0 +1,154 @@
+import sqlite3
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import (
+    DatabaseError,
+    OperationalError,
+    ProgrammingError,
+    TimeoutError,
+)
+
+from app import executor
+from app.ps_cases import AdmApplData
+from app.store import ResultStore, repeatable
+from config import Config
+from tests.test_executor import ListPublisher, raw_case
+
+
+@pytest.fixture
+def db_url(tmp_path):
+    url = f"sqlite:///{tmp_path / 'ps.db'}"
+    engine = create_engine(url)
+    engine.execute(
+        "create table ps_adm_appl_data "
+        "(adm_appl_nbr text, emplid text, last_updt_dttm text)"
+    )
+    for i in range(3):
+        engine.execute(
+            f"insert into ps_adm_appl_data values ('{i:03}', 'E{i}', '2021-01-01')"
+        )
+    return url
+
+
+@pytest.fixture
+def config(db_url, tmp_path):
+    class TestConfig(Config):
+        TEST_PLAN = "peoplesoft"
+        TEST_MODE = "peoplesoft"
+        DEBUG = False
+        PS_DB_URL = db_url
+        RESULT_STORE = str(tmp_path / "results.db")
+
+    return TestConfig
+
+
+@pytest.fixture
+def publisher():
+    return ListPublisher(
+        [
+            raw_case(2, "000", expected="wrong", status="Fail"),
+            raw_case(3, "001", expected="wrong", status="Fail"),
+            raw_case(4, "002", expected="wrong", status="Untested"),
+        ]
+    )
+
+
+def published_rows(publisher, run):
+    return [r.idx for r in publisher.published[run]]
+
+
+def test_skips_unchanged_failures(config, publisher, db_url):
+    app = executor.TestExecutor(config, publisher)
+    assert app.run()["skipped"] == 0
+    assert published_rows(publisher, 0) == [2, 3, 4]
+
+    summary = app.run()
+    assert summary["skipped"] == 2
+    assert published_rows(publisher, 1) == [4]
+
+    create_engine(db_url).execute(
+        "update ps_adm_appl_data set last_updt_dttm = '2021-02-01' "
+        "where adm_appl_nbr = '001'"
+    )
+    assert app.run()["skipped"] == 1
+    assert published_rows(publisher, 2) == [3, 4]
+
+
+def test_changed_rows_are_rerun(config, publisher):
+    executor.TestExecutor(config, publisher).run()
+    publisher.cases[0]["expected"] = "still wrong"
+    app = executor.TestExecutor(config, publisher)
+    app.run()
+    assert published_rows(publisher, 1) == [2, 4]
+
+
+def test_store_keeps_run_history(config, publisher):
+    app = executor.TestExecutor(config, publisher)
+    app.run()
+    app.run()
+    history = ResultStore(config.RESULT_STORE).history()
+    assert [(run[0], run[4], run[5]) for run in history] == [(2, 1, 2), (1, 3, 0)]
+    results = app.store.conn.execute("select count(*) from results").fetchone()
+    assert results == (4,)
+
+
+def test_only_failing_cases_fetch_markers(config, publisher):
+    app = executor.TestExecutor(config, publisher)
+    app.run()
+    markers = {c.idx: c.marker for c in app.test_cases}
+    assert markers == {2: "2021-01-01", 3: "2021-01-01", 4: None}
+
+
+def test_query_errors_are_skipped(config, publisher):
+    publisher.cases = [raw_case(2, "000", field="not_a_column", status="Error")]
+    app = executor.TestExecutor(config, publisher)
+    app.run()
+    assert app.run()["skipped"] == 1
+
+
+def sqlite_error(sql):
+    try:
+        sqlite3.connect(":memory:").execute(sql)
+    except sqlite3.Error as e:
+        return e
+
+
+@pytest.mark.parametrize(
+    "exc, expected",
+    [
+        (None, True),
+        (DatabaseError("select", {}, Exception("ORA-00904: invalid identifier")), True),
+        (DatabaseError("select", {}, Exception("ORA-01722: invalid number")), True),
+        (DatabaseError("select", {}, Exception("ORA-00060: deadlock detected")), False),
+        (DatabaseError("select", {}, Exception("ORA-03113: end-of-file")), False),
+        (ProgrammingError("select", {}, Exception("42S22", "Invalid column")), True),
+        (OperationalError("select", {}, Exception("40001", "Deadlock victim")), False),
+        (OperationalError("select", {}, Exception("08S01", "Link failure")), False),
+        (OperationalError("select", {}, sqlite_error("select nope")), True),
+        (OperationalError("select", {}, Exception("database is locked")), False),
+        (ProgrammingError("select", {}, Exception("invalid column")), True),
+        (TimeoutError("QueuePool limit reached"), False),
+        (KeyError("export 3"), True),
+    ],
+)
+def test_repeatable(exc, expected):
+    test_case = AdmApplData(2, "000", "emplid", "")
+    test_case._exc = exc
+    assert repeatable(test_case) is expected
+
+
+def test_plans_share_a_store(tmp_path):
+    path = str(tmp_path / "results.db")
+    commonapp, coalition = ResultStore(path, "commonapp"), ResultStore(path, "coalition")
+    failing = AdmApplData(2, "000", "emplid", "wrong", status="Fail")
+    failing.store_result("E0")
+    failing.marker = "2021-01-01"
+    run_id = commonapp.start_run()
+    commonapp.record(run_id, failing)
+    # results wait for commit, so the other plan can write meanwhile
+    coalition.record(coalition.start_run(), failing)
+    coalition.commit()
+    commonapp.commit()
+    assert commonapp.unchanged([failing]) == [failing]
+    assert ResultStore(path, "transfer").unchanged([failing]) == []
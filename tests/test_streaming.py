@@ -0,0 +1,42 @@
+import time
+
+import pytest
+
+from app.streaming import StreamingPublisher
+
+
+class RecordingPublisher:
+    def __init__(self, fail=False):
+        self.published = []
+        self.fail = fail
+
+    def publish(self, test_results):
+        if self.fail:
+            raise RuntimeError("quota exceeded")
+        self.published.append(list(test_results))
+
+
+def test_flushes_every_flush_size_results():
+    publisher = RecordingPublisher()
+    stream = StreamingPublisher(publisher, flush_size=2, flush_interval=60)
+    for i in range(5):
+        stream.put(i)
+    stream.close()
+    assert publisher.published == [[0, 1], [2, 3], [4]]
+    assert stream.published == 5
+
+
+def test_flushes_after_flush_interval():
+    publisher = RecordingPublisher()
+    stream = StreamingPublisher(publisher, flush_size=100, flush_interval=0.05)
+    stream.put(1)
+    time.sleep(0.3)
+    assert publisher.published == [[1]]
+    stream.close()
+
+
+def test_publish_errors_are_raised_on_close():
+    stream = StreamingPublisher(RecordingPublisher(fail=True), flush_size=1)
+    stream.put(1)
+    with pytest.raises(RuntimeError):
+        stream.close()
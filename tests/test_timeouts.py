@@ -0,0 +1,42 @@
+import threading
+import time
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+
+from app.timeouts import install_timeouts, is_timeout
+
+SLOW_SQL = """
+with recursive n(i) as (select 1 union all select i + 1 from n where i < 100000000)
+select count(*) from n
+"""
+
+
+def test_is_timeout():
+    assert is_timeout(Exception("[HYT00] [Microsoft][ODBC Driver 17] Query timeout"))
+    assert is_timeout(Exception("DPI-1067: call timeout of 5000 ms exceeded"))
+    assert is_timeout(Exception("interrupted"))
+    assert not is_timeout(Exception("ORA-00904: invalid identifier"))
+
+
+def test_watchdog_cancels_slow_queries(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'slow.db'}")
+    install_timeouts(engine, 0.2)
+    start = time.monotonic()
+    with pytest.raises(OperationalError) as e:
+        engine.execute(SLOW_SQL)
+    assert time.monotonic() - start < 5
+    assert is_timeout(e.value)
+    # the watchdog is stopped once a statement finishes
+    assert engine.execute("select 1").scalar() == 1
+
+
+def test_one_watchdog_thread_for_every_statement(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'fast.db'}")
+    install_timeouts(engine, 30)
+    engine.execute("select 1")
+    threads = threading.active_count()
+    for _ in range(50):
+        assert engine.execute("select 1").scalar() == 1
+    assert threading.active_count() == threads
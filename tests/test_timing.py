@@ -0,0 +1,50 @@
+import json
+
+from app.timing import QueryTimer, TimingReport
+
+
+class TimedCase:
+    def __init__(self, idx, field, duration):
+        self.idx = idx
+        self.field = field
+        self.export = None
+        self.external_id = f"{idx:03}"
+        self.batch_size = 1
+        self.timings = {"build": 0.0, "execute": duration, "fetch": 0.0}
+        self.duration = duration
+
+
+def test_query_timer_accumulates_phases():
+    timer = QueryTimer()
+    timer.lap("build")
+    timer.lap("execute")
+    timer.lap("execute")
+    assert set(timer.timings) == {"build", "execute", "fetch"}
+    assert timer.timings["fetch"] == 0.0
+    assert all(v >= 0 for v in timer.timings.values())
+
+
+def test_report_keeps_slowest_cases():
+    report = TimingReport(threshold=0.5, keep=2)
+    for idx, duration in enumerate([0.1, 0.9, 0.3, 0.6]):
+        report.add(TimedCase(idx, "emplid" if idx % 2 else "acad_prog", duration))
+    assert [c.idx for c in report.slowest()] == [1, 3]
+    assert [c.idx for c in report.slow] == [1, 3]
+    count, total, longest = report.destinations["TimedCase"]
+    assert (count, round(total, 3), longest) == (4, 1.9, 0.9)
+    assert report.fields[("TimedCase", "emplid")][0] == 2
+    assert "2 cases took longer than 0.5s" in report.report()
+
+
+def test_report_skips_unexecuted_cases(tmp_path):
+    report = TimingReport()
+    unexecuted = TimedCase(1, "emplid", 0.1)
+    unexecuted.duration = None
+    report.add(unexecuted)
+    report.add(TimedCase(2, "emplid", 0.2))
+    path = tmp_path / "timings.jsonl"
+    report.write_jsonl(str(path))
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [(line["idx"], line["total"], line["slow"]) for line in lines] == [
+        (2, 0.2, False)
+    ]